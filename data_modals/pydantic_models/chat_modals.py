@@ -1,7 +1,10 @@
 
+from typing import Literal
+
 from pydantic import BaseModel
 class UserMessageModal(BaseModel):
     message: str
 
 class TaskResponse(BaseModel):
-    task_id: str
\ No newline at end of file
+    task_id: str
+    status: Literal["pending"] = "pending"
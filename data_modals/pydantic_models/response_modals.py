@@ -9,6 +9,7 @@ class ChatResponse(BaseModel):
     links: List[dict]
     timestamp: datetime
     status: Literal["success", "pending", "error", "started","over limit"]
+    index_version: Optional[str] = None
 
 class RequestBody(BaseModel):
     query: str
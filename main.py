@@ -29,8 +29,8 @@ timings = {}
 # ✅ Global ThreadPoolExecutor (shared across all tasks)
 executor = concurrent.futures.ThreadPoolExecutor(max_workers=5)
 
-storage_contexts, embed_model = get_data_sources()
-auto_merging_retriever = AutomergingRetriverInit(storage_contexts, embed_model)
+index_dirs, embed_model = get_data_sources()
+auto_merging_retriever = AutomergingRetriverInit(index_dirs, embed_model)
 
 groq_gaurdrail_obj = GroqGuardrail()
 
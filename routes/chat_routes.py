@@ -1,66 +1,164 @@
+import asyncio
+import json
+
 from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.encoders import jsonable_encoder
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from services.auth.auth import get_current_user_jwt
-from tasks.chat_tasks import process_chat
+from tasks.signatures import submit_chat
 from agents import InputGuardrailTripwireTriggered
+from data_modals.pydantic_models.chat_modals import TaskResponse
 from data_modals.pydantic_models.response_modals import ChatResponse, ErrorResponse, RequestBody
 from utils.db.user_utils import reset_cross_limit_if_expired
+from utils.task_results.chat_events import format_sse, iter_chat_events
+from utils.task_results.result_waiter import CHAT_RESULT_TIMEOUT, TaskFailedError, result_waiter
+from utils.task_results.single_flight import coalesced_leader, shareable
 
 load_dotenv()
 
 chat_router = APIRouter()
 
+def build_chat_response(task_id: str, result: dict, user=None):
+    """
+    Turn the result of a process_chat task into the HTTP response.
+    Args:
+        task_id: celery task id
+        result: dict returned by process_chat
+        user: user row from reset_cross_limit_if_expired, used for the over limit message
+
+    Returns: ChatResponse or JSONResponse
+    """
+    status = result.get("status")
+
+    if status == "success" or  status == "blocked":
+        print(f"✅ Task {task_id} completed successfully.")
+        print("⏱️ Timings:", result.get("timings"))
+        return ChatResponse(
+            message=result["message"],
+            links=result["links"],
+            timestamp=datetime.utcnow(),
+            status="success",
+            index_version=result.get("index_version")
+        )
+    elif status == "over limit":
+        print(f"❌ Task {task_id} failed: {result.get('error')}")
+        default_detail = f"User limit is over until {user['expired_at'] + timedelta(hours=12)}." if user else "User limit is over."
+        return JSONResponse(
+            status_code=429,
+            content=jsonable_encoder(ErrorResponse(
+                detail=result.get("error", default_detail),
+                status="error",
+                links=[],
+                timestamp=datetime.utcnow()
+            ))
+        )
+    else:
+        print(f"❌ Task {task_id} failed: {result.get('error')}")
+        return JSONResponse(
+            status_code=400,
+            content=jsonable_encoder(ErrorResponse(
+                detail=result.get("error", "Unknown error"),
+                status="error",
+                links=[],
+                timestamp=datetime.utcnow()
+            ))
+        )
+
+
+def accepted_response(task_id: str):
+    return JSONResponse(
+        status_code=202,
+        content=jsonable_encoder(TaskResponse(task_id=task_id, status="pending"))
+    )
+
+
+async def resubmit_chat(coalesced: dict, email: str, stream: bool = False) -> str:
+    """
+    Run a coalesced chat again after its leader failed (ChatSingleFlight).
+    Args:
+        coalesced: COALESCED_STATUS result of the duplicate task
+        email: user email
+        stream: publish progress events for /chat/stream
+
+    Returns: id of the new task
+    """
+    task = submit_chat(coalesced["query"], email, stream=stream, attempt=coalesced["attempt"] + 1)
+    print(f"🔁 Leader {coalesced['leader_task_id']} failed, chat resubmitted as {task.id}")
+    await result_waiter.set_owner(task.id, email)
+    return task.id
+
+
+async def wait_chat(task_id: str, email: str, timeout: float = CHAT_RESULT_TIMEOUT):
+    """
+    Wait for a chat, following a coalesced task to its leader's result.
+    Args:
+        task_id: celery task id
+        email: user email
+        timeout: seconds to wait in total
+
+    Returns: (id of the user's task to poll, result or None when it is not ready in time)
+    Raises: TaskFailedError when the user's own task failed
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    poll_id = task_id
+    coalesced = None
+    while True:
+        try:
+            result = await result_waiter.wait(task_id, max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            return poll_id, None
+        except TaskFailedError:
+            if coalesced is None:
+                raise
+            result = None
+
+        leader = coalesced_leader(result)
+        if leader is not None:
+            print(f"🤝 Task {task_id} coalesced with {leader}")
+            coalesced, task_id = result, leader
+        elif coalesced is not None and not shareable(result):
+            task_id = poll_id = await resubmit_chat(coalesced, email)
+            coalesced = None
+        else:
+            return poll_id, result
+
+
 @chat_router.post(
     "/chat",
     responses={
         200: {"model": ChatResponse},
+        202: {"model": TaskResponse},
         400: {"model": ErrorResponse}
     }
 )
 async def chat(request_body: RequestBody,
+               wait: bool = True,
                email: str = Depends(get_current_user_jwt)
                ):
+    """
+    wait=true awaits the result on the event loop (Redis pub/sub, no blocking task.get);
+    wait=false, or a result that is not ready in time, answers 202 with the task id for GET /chat/{task_id}.
+    """
     try:
-        user = reset_cross_limit_if_expired(email)
-        task = process_chat.delay(request_body.query, email)
+        # Blocking DB helper: kept off the event loop like the result waits
+        user = await run_in_threadpool(reset_cross_limit_if_expired, email)
+        task = submit_chat(request_body.query, email)
         print(f"✅ Task created with ID: {task.id}")
-        result = task.get(timeout=100)
-        status = result.get("status")
-
-        if status == "success" or  status == "blocked":
-            print(f"✅ Task {task.id} completed successfully.")
-            print("⏱️ Timings:", result.get("timings"))
-            return ChatResponse(
-                message=result["message"],
-                links=result["links"],
-                timestamp=datetime.utcnow(),
-                status="success"
-            )
-        elif status == "over limit":
-            print(f"❌ Task {task.id} failed: {result.get('error')}")
-            return JSONResponse(
-                status_code=429,
-                content=jsonable_encoder(ErrorResponse(
-                    detail=result.get("error", f"User limit is over until {user['expired_at'] + timedelta(hours=12)}."),
-                    status="error",
-                    links=[],
-                    timestamp=datetime.utcnow()
-                ))
-            )
-        else:
-            print(f"❌ Task {task.id} failed: {result.get('error')}")
-            return JSONResponse(
-                status_code=400,
-                content=jsonable_encoder(ErrorResponse(
-                    detail=result.get("error", "Unknown error"),
-                    status="error",
-                    links=[],
-                    timestamp=datetime.utcnow()
-                ))
-            )
+        await result_waiter.set_owner(task.id, email)
+
+        if not wait:
+            return accepted_response(task.id)
+
+        task_id, result = await wait_chat(task.id, email)
+        if result is None:
+            print(f"⏳ Task {task_id} still running, answering 202")
+            return accepted_response(task_id)
+
+        return build_chat_response(task_id, result, user)
 
     except InputGuardrailTripwireTriggered:
         print("❌ Guardrail triggered")
@@ -85,3 +183,80 @@ async def chat(request_body: RequestBody,
                 timestamp=datetime.utcnow()
             ))
         )
+
+
+@chat_router.get(
+    "/chat/{task_id}",
+    responses={
+        200: {"model": ChatResponse},
+        202: {"model": TaskResponse},
+        404: {"model": ErrorResponse}
+    }
+)
+async def chat_result(task_id: str, email: str = Depends(get_current_user_jwt)):
+    """
+    Poll the result of a chat submitted with POST /chat.
+    A coalesced chat answers with its leader's result; a failed leader is reported as is
+    (POST /chat resubmits, polling does not).
+    """
+    owner = await result_waiter.get_owner(task_id)
+    if owner != email:
+        return JSONResponse(
+            status_code=404,
+            content=jsonable_encoder(ErrorResponse(
+                detail="Chat task not found.",
+                status="error",
+                links=[],
+                timestamp=datetime.utcnow()
+            ))
+        )
+
+    try:
+        ready, result = await result_waiter.peek(task_id)
+        leader = coalesced_leader(result)
+        if leader is not None:
+            ready, result = await result_waiter.peek(leader)
+    except TaskFailedError as e:
+        print(f"❌ Task {task_id} failed: {e}")
+        return JSONResponse(
+            status_code=400,
+            content=jsonable_encoder(ErrorResponse(
+                detail=str(e.info),
+                status="error",
+                links=[],
+                timestamp=datetime.utcnow()
+            ))
+        )
+
+    if not ready:
+        return accepted_response(task_id)
+    return build_chat_response(task_id, result)
+
+
+@chat_router.post("/chat/stream")
+async def chat_stream(request_body: RequestBody,
+                      email: str = Depends(get_current_user_jwt)
+                      ):
+    """
+    Server-sent events for one chat: "task", "progress", "links" (right after retrieval),
+    "token" (pieces of the answer) and finally "done" with the raw process_chat result
+    (status, message, links, timings), or "error" when the task failed or timed out.
+    Unlike POST /chat, "done" is not mapped through build_chat_response.
+    A duplicate of an in-flight chat relays the leader's events after a "coalesced"
+    progress event, and a "resubmitted" one when the leader failed and the chat runs again.
+    """
+    await run_in_threadpool(reset_cross_limit_if_expired, email)
+    task = submit_chat(request_body.query, email, stream=True)
+    print(f"✅ Streaming task created with ID: {task.id}")
+    await result_waiter.set_owner(task.id, email)
+
+    async def events():
+        yield format_sse("task", json.dumps({"task_id": task.id}))
+        async for frame in iter_chat_events(task.id, resubmit=lambda coalesced: resubmit_chat(coalesced, email, stream=True)):
+            yield frame
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,226 @@
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.retrivers.index_versions import resolve_index_dir
+from utils.retrivers.numpy_vector_store import VECTORS_FILE, has_numpy_vector_store
+
+CATEGORY_CLASSIFIER_ENABLED = os.getenv("CATEGORY_CLASSIFIER_ENABLED", "true").lower() == "true"
+
+# Queries below this confidence are sent to the Groq guardrail
+CATEGORY_CLASSIFIER_MIN_CONFIDENCE = float(os.getenv("CATEGORY_CLASSIFIER_MIN_CONFIDENCE", "0.75"))
+
+# Softmax temperature over per-label cosine scores; lower makes confidence sharper
+CATEGORY_CLASSIFIER_TEMPERATURE = float(os.getenv("CATEGORY_CLASSIFIER_TEMPERATURE", "0.05"))
+
+# Labelled example queries. Labels without an index (other categories, "not_relevant")
+# are never routed locally: they only compete with the indexed categories, so that a
+# query about cooking or US law ends up with low confidence and goes to Groq.
+CATEGORY_EXAMPLE_QUERIES = {
+    "law_of_crimes": [
+        "What are the penalties under the Penal Code?",
+        "What is the punishment for murder in Sri Lanka?",
+        "What is the difference between culpable homicide and murder?",
+        "How do I apply for bail after an arrest?",
+        "Can the police arrest someone without a warrant?",
+        "What is the punishment for theft?",
+        "How long can a suspect be held in remand?",
+        "What is the procedure for filing a first information report?",
+        "What are the offences under the Prevention of Terrorism Act?",
+        "What is the maximum sentence for robbery?",
+        "When can a magistrate issue a search warrant?",
+        "What is criminal breach of trust?",
+    ],
+    "law_of_property": [
+        "How to register a lease agreement?",
+        "How to transfer property ownership in Sri Lanka?",
+        "What is prescriptive title to land?",
+    ],
+    "family_law": [
+        "What are the grounds for divorce?",
+        "How is child custody decided?",
+        "How do I register a marriage?",
+    ],
+    "constitutional_law": [
+        "How to file a Fundamental Rights petition in Sri Lanka?",
+        "What are the powers of the President under the Constitution?",
+    ],
+    "tesawalamai_law": ["What is Tesawalamai law?"],
+    "kandyan_law": ["What are the marriage laws under Kandyan Law?"],
+    "muslim_personal_law": ["How does divorce work under Muslim law in Sri Lanka?"],
+    "labour_law": ["How much notice must an employer give before termination?", "What is the EPF contribution rate?"],
+    "law_of_contracts": ["What makes a contract legally binding?", "What happens if a party breaches a contract?"],
+    "immigration_law": ["I want to apply for a passport.", "How do I get a visa extension?"],
+    "taxation_law": ["How is income tax calculated for individuals?"],
+    "not_relevant": [
+        "How to bake a cake?",
+        "How to improve memory for exams?",
+        "What is the best workout for weight loss?",
+        "Recommend a good movie to watch tonight.",
+        "Can I get a divorce in the US if I am Sri Lankan?",
+        "What is the punishment for murder under Indian law?",
+        "Write me a poem about the ocean.",
+    ],
+}
+
+# Personal data the security guardrail must see: case numbers, NIC numbers, emails, phone numbers
+_PII_PATTERNS = [
+    re.compile(r"\b[A-Z]{1,4}\s*/\s*\d{1,6}\s*/\s*\d{2,4}\b", re.IGNORECASE),  # HC/1234/2023
+    re.compile(r"\bcase\s*(?:no|number|#)\b", re.IGNORECASE),
+    re.compile(r"\b(?:\d{9}[vVxX]|\d{12})\b"),  # old and new NIC formats
+    re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.]+\b"),
+    re.compile(r"(?:\+94|\b0)\s*\d{2}\s*-?\s*\d{3}\s*-?\s*\d{4}\b"),
+]
+
+
+def contains_pii(query: str) -> bool:
+    return any(pattern.search(query) for pattern in _PII_PATTERNS)
+
+
+class EmbeddingCategoryClassifier:
+    """
+    On-box category router built on the shared query embedding model.
+
+    Every label has prototype vectors: the embeddings of its example queries and, for
+    indexed categories, the centroid of the category's chunk vectors. A query scores
+    each label by its nearest prototype; confidence is the softmax of those scores.
+    """
+
+    def __init__(
+        self,
+        embed_model,
+        index_dirs_by_category: dict,
+        example_queries: Optional[Dict[str, List[str]]] = None,
+        min_confidence: float = CATEGORY_CLASSIFIER_MIN_CONFIDENCE,
+        temperature: float = CATEGORY_CLASSIFIER_TEMPERATURE,
+    ):
+        """
+        Args:
+            embed_model: shared embedding model (the same one used for retrieval)
+            index_dirs_by_category: Dict of category -> category directory
+            example_queries: label -> example queries, defaults to CATEGORY_EXAMPLE_QUERIES
+            min_confidence: confidence needed to route without Groq
+            temperature: softmax temperature over label scores
+        """
+        self.embed_model = embed_model
+        self.index_dirs = index_dirs_by_category
+        self.example_queries = example_queries or CATEGORY_EXAMPLE_QUERIES
+        self.min_confidence = min_confidence
+        self.temperature = temperature
+
+        self._labels: List[str] = []
+        self._prototypes: Optional[np.ndarray] = None
+        self._prototype_labels: Optional[np.ndarray] = None
+        self._example_vectors: Optional[list] = None
+        self._lock = threading.Lock()
+
+        self.local_routes = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def _chunk_centroid(self, category: str) -> Optional[np.ndarray]:
+        category_dir = self.index_dirs.get(category)
+        if not isinstance(category_dir, str):
+            return None
+        persist_dir = resolve_index_dir(category_dir)[0]
+        if not has_numpy_vector_store(persist_dir):
+            return None
+        vectors = np.load(os.path.join(persist_dir, VECTORS_FILE), mmap_mode="r")
+        if not len(vectors):
+            return None
+        return self._normalize(np.asarray(vectors.mean(axis=0), dtype=np.float32))
+
+    def _build(self):
+        """Embed the example queries and load the chunk centroids (again after invalidate)."""
+        labels = sorted(set(self.example_queries) | set(self.index_dirs))
+        label_ids = {label: i for i, label in enumerate(labels)}
+        vectors, owners = [], []
+
+        texts, text_owners = [], []
+        for label, queries in self.example_queries.items():
+            texts.extend(queries)
+            text_owners.extend([label_ids[label]] * len(queries))
+        if texts:
+            # Example queries do not change with the indexes: embedded once, kept across rebuilds
+            if self._example_vectors is None:
+                # The MiniLM model embeds queries and passages the same way, so one batch call will do
+                self._example_vectors = list(self.embed_model.get_text_embedding_batch(texts))
+            vectors.extend(self._example_vectors)
+            owners.extend(text_owners)
+
+        for category in self.index_dirs:
+            centroid = self._chunk_centroid(category)
+            if centroid is not None:
+                vectors.append(centroid)
+                owners.append(label_ids[category])
+
+        self._labels = labels
+        self._prototypes = self._normalize(np.asarray(vectors, dtype=np.float32))
+        self._prototype_labels = np.asarray(owners, dtype=np.int64)
+
+    def _ensure_built(self):
+        """Returns: (labels, prototypes, prototype labels), consistent even if invalidated meanwhile"""
+        with self._lock:
+            if self._prototypes is None:
+                self._build()
+            return self._labels, self._prototypes, self._prototype_labels
+
+    def invalidate(self, category: str = None, version: str = None):
+        """
+        Rebuild the prototypes on next use, e.g. when a category publishes a new index
+        version and its chunk centroid moved. Signature matches an index version listener.
+        """
+        with self._lock:
+            self._prototypes = None
+
+    def classify(self, query: str) -> dict:
+        """
+        Returns: {"category", "confidence", "routable", "pii", "duration_ms"}
+                 routable is True when the category can be used without calling Groq
+        """
+        start = time.time()
+        labels, prototypes, prototype_labels = self._ensure_built()
+
+        query_vector = self._normalize(np.asarray(self.embed_model.get_query_embedding(query), dtype=np.float32))
+        similarities = prototypes @ query_vector
+
+        # Nearest prototype per label
+        label_scores = np.full(len(labels), -1.0, dtype=np.float32)
+        np.maximum.at(label_scores, prototype_labels, similarities)
+
+        probabilities = np.exp((label_scores - label_scores.max()) / self.temperature)
+        probabilities /= probabilities.sum()
+        best = int(np.argmax(probabilities))
+        category = labels[best]
+        confidence = float(probabilities[best])
+
+        pii = contains_pii(query)
+        routable = category in self.index_dirs and confidence >= self.min_confidence and not pii
+        if routable:
+            self.local_routes += 1
+        else:
+            self.fallbacks += 1
+
+        return {
+            "category": category,
+            "confidence": round(confidence, 4),
+            "routable": routable,
+            "pii": pii,
+            "duration_ms": round((time.time() - start) * 1000, 2),
+        }
+
+    def stats(self) -> dict:
+        total = self.local_routes + self.fallbacks
+        return {
+            "local_routes": self.local_routes,
+            "groq_fallbacks": self.fallbacks,
+            "local_rate": round(self.local_routes / total, 4) if total else 0.0,
+        }
@@ -1,14 +1,28 @@
+import asyncio
 import json
-import os
-
-from groq import Groq
 
 from difflib import SequenceMatcher
 
+from services.llm_clients.llm_client import hedge_alternate, llm_clients
+from services.gaurdrails_groq.verdict_cache import GUARDRAIL_CACHE_TTL, GuardrailVerdictCache
 from services.prompts.guardrail_prompts import legal_category_classification_prompt, security_guardrail_prompt, \
     relevancy_guardrail_prompt
+from utils.cache.redis_cache import RedisCacheTier
+
+GUARDRAIL_MODEL = "llama-3.3-70b-versatile"
+
+# Checks run by the guardrail engine: (verdict name, system prompt).
+# The "category" verdict decides the category returned to the caller.
+GUARDRAIL_CHECKS = [
+    ("category", legal_category_classification_prompt),
+    ("relevancy", relevancy_guardrail_prompt),
+    ("security", security_guardrail_prompt),
+]
 
-client = Groq(os.environ["GROQ_API_KEY"] )
+# Verdicts never change for the same prompts and query text, so they are shared by all requests
+verdict_cache = GuardrailVerdictCache(
+    shared_tier=RedisCacheTier.from_env("GUARDRAIL_CACHE_REDIS_URL", prefix="guard", ttl_seconds=GUARDRAIL_CACHE_TTL),
+)
 
 
 class GroqInputGuardrailTriggeredException(Exception):
@@ -30,8 +44,14 @@ class GroqGuardrail:
 
     # query = None
 
-    def __init__(self):
-        pass
+    def __init__(self, checks=None, cache=None):
+        """
+        Args:
+            checks: list of (verdict name, system prompt), defaults to GUARDRAIL_CHECKS
+            cache: GuardrailVerdictCache, defaults to the process-wide verdict_cache
+        """
+        self.checks = checks or GUARDRAIL_CHECKS
+        self.cache = cache or verdict_cache
 
     def call_groq(self, system_prompt,query, n=1, temperature=0.1, max_tokens=200):
             """
@@ -46,8 +66,9 @@ class GroqGuardrail:
             Returns:
 
             """
-            response = client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
+            response = llm_clients.chat_completion_sync(
+                "groq",
+                GUARDRAIL_MODEL,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": query}
@@ -58,6 +79,25 @@ class GroqGuardrail:
             )
             return response.choices[0].message.content
 
+    async def acall_groq(self, system_prompt, query, n=1, temperature=0.1, max_tokens=200):
+        """
+        Async version of call_groq. Slow calls are hedged to the alternate provider.
+        """
+        response = await llm_clients.hedged_chat_completion(
+            "groq",
+            GUARDRAIL_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": query}
+            ],
+            alternate=hedge_alternate,
+            hedge_key="guardrail",
+            temperature=temperature,
+            max_tokens=max_tokens,
+            n=n
+        )
+        return response.choices[0].message.content
+
     def exception_verifier(self,llm_output,reasoning):
         """
         Function to check if an exception needs to be thrown
@@ -88,30 +128,100 @@ class GroqGuardrail:
             raise GroqInputGuardrailTriggeredException(message="Operation Not Relevant",reasoning=reasoning)
 
 
+    async def _run_check(self, name, prompt, query):
+        groq_response = await self.acall_groq(prompt, query)# running groq instances
+        return name, json.loads(groq_response)# LOADING groq response to dict
+
+    async def arun_guardrail(self, query):
+        """
+        Function to run all guardrails at once. Every check is sent concurrently and the
+        remaining calls are cancelled as soon as one of them trips.
+        Args:
+            query: user message
+
+        Returns: { "relevancy", "category", "reasoning", "verdicts": {check name: response} }
+        triggers a Exception if input not safe
+
+        """
+        cache_key = self.cache.key("guardrail", [f"{name}:{prompt}" for name, prompt in self.checks], query)
+        # The shared tier is a blocking Redis client: keep it off the event loop
+        cached = await asyncio.to_thread(self.cache.get, cache_key)
+        if cached is not None:
+            if cached.get("tripped"):
+                raise GroqInputGuardrailTriggeredException(message="Operation Not Relevant", reasoning=cached["reasoning"])
+            return cached
+
+        tasks = [asyncio.create_task(self._run_check(name, prompt, query)) for name, prompt in self.checks]
+        verdicts = {}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                name, response_json = await next_done
+                verdicts[name] = response_json
+                self.exception_verifier(response_json['relevancy'],response_json['reasoning'])#verifying execptions
+        except GroqInputGuardrailTriggeredException as e:
+            await asyncio.to_thread(
+                self.cache.set, cache_key, {"tripped": True, "relevancy": "not relevant", "reasoning": e.reasoning}
+            )
+            raise
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+        result = self.merge_verdicts(verdicts)
+        await asyncio.to_thread(self.cache.set, cache_key, result)
+        return result
+
+    @staticmethod
+    def merge_verdicts(verdicts):
+        """
+        Merge per-check responses: category comes from the classification check,
+        falling back to whatever category another check returned.
+        """
+        primary = verdicts.get("category") or next(iter(verdicts.values()))
+        category = primary.get("category")
+        if not category:
+            category = next((v.get("category") for v in verdicts.values() if v.get("category")), None)
+        return {
+            "relevancy": "relevant",
+            "category": category,
+            "reasoning": primary.get("reasoning"),
+            "verdicts": verdicts,
+        }
+
     def run_guardrail(self,query):
         """
-        Function  run all guardrails at once
+        Function  run all guardrails at once (sync wrapper around arun_guardrail for worker threads)
         Args:
             query: user message
 
-        Returns: None triggers a Exception if input not safe
+        Returns: merged verdicts, triggers a Exception if input not safe
 
         """
-        guardrails = [legal_category_classification_prompt, relevancy_guardrail_prompt, security_guardrail_prompt]# SELECT prompt
-        for guardrail in guardrails:
-            groq_response = self.call_groq(guardrail,query)# running groq instances
-            response_json = json.loads(groq_response)# LOADING groq response to dict
-            self.exception_verifier(response_json['relevancy'],response_json['reasoning'])#verifying execptions
-            return response_json
+        async def run_and_close():
+            try:
+                return await self.arun_guardrail(query)
+            finally:
+                # asyncio.run closes its loop, so release that loop's connections too
+                await llm_clients.aclose_loop()
+
+        return asyncio.run(run_and_close())
 
     def classify_category(self, query):
         """
         Classify the user's query into a legal category.
         Returns a dictionary: { "category": "...", "reasoning": "..." }
         """
+        cache_key = self.cache.key("classify", [legal_category_classification_prompt], query)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         response = self.call_groq(legal_category_classification_prompt, query)
         try:
-            return json.loads(response)
+            result = json.loads(response)
+            self.cache.set(cache_key, result)
+            return result
         except json.JSONDecodeError:
             return {
                 "category": "other",
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+from typing import Iterable, Optional
+
+from utils.cache.redis_cache import RedisCacheTier
+from utils.cache.ttl_lru_cache import TTLLRUCache
+from utils.tools.query_normalizer import normalize_query
+
+GUARDRAIL_CACHE_ENABLED = os.getenv("GUARDRAIL_CACHE_ENABLED", "true").lower() == "true"
+GUARDRAIL_CACHE_SIZE = int(os.getenv("GUARDRAIL_CACHE_SIZE", "4096"))
+GUARDRAIL_CACHE_TTL = int(os.getenv("GUARDRAIL_CACHE_TTL", "86400"))
+
+
+def prompt_hash(prompts: Iterable[str]) -> str:
+    """Short hash of the prompt texts; editing any prompt starts a fresh key space."""
+    digest = hashlib.sha1()
+    for prompt in prompts:
+        digest.update(prompt.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:12]
+
+
+class GuardrailVerdictCache:
+    """
+    Cache of guardrail and classification verdicts keyed by prompt hash and normalized query.
+
+    Lookups go to a bounded in-process LRU/TTL cache first, then to an optional Redis
+    tier shared by all workers. Values are the verdict dicts returned by GroqGuardrail.
+    """
+
+    def __init__(
+        self,
+        max_size: int = GUARDRAIL_CACHE_SIZE,
+        ttl_seconds: int = GUARDRAIL_CACHE_TTL,
+        shared_tier: Optional[RedisCacheTier] = None,
+        enabled: bool = GUARDRAIL_CACHE_ENABLED,
+    ):
+        """
+        Args:
+            max_size: max entries of the in-process cache
+            ttl_seconds: lifetime of cached verdicts
+            shared_tier: optional Redis tier shared across Celery workers
+            enabled: False turns every lookup into a miss
+        """
+        self.enabled = enabled
+        self._local = TTLLRUCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self._shared = shared_tier
+        self._shared_hits = 0
+
+    @staticmethod
+    def key(scope: str, prompts: Iterable[str], query: str) -> str:
+        """
+        Args:
+            scope: which call the verdict belongs to, e.g. "guardrail" or "classify"
+            prompts: system prompts the verdict was produced with
+            query: raw user query (normalized for case, whitespace and punctuation)
+        """
+        normalized = normalize_query(query, strip_punctuation=True)
+        query_hash = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        return f"{scope}:{prompt_hash(prompts)}:{query_hash}"
+
+    def get(self, key: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        verdict = self._local.get(key)
+        if verdict is not None:
+            return dict(verdict)
+
+        if self._shared is not None:
+            raw = self._shared.get(key)
+            if raw is not None:
+                verdict = json.loads(raw)
+                self._local.set(key, verdict)
+                self._shared_hits += 1
+                return dict(verdict)
+        return None
+
+    def set(self, key: str, verdict: dict):
+        if not self.enabled:
+            return
+        self._local.set(key, dict(verdict))
+        if self._shared is not None:
+            self._shared.set(key, json.dumps(verdict).encode("utf-8"))
+
+    def stats(self) -> dict:
+        stats = {"local": self._local.stats(), "shared_hits": self._shared_hits}
+        if self._shared is not None:
+            stats["redis"] = self._shared.stats()
+        return stats
@@ -0,0 +1,364 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Optional
+
+import groq
+import httpx
+import openai
+from groq import AsyncGroq, Groq
+from openai import AsyncOpenAI, OpenAI
+
+from services.llm_clients.resilience import CircuitBreaker, CircuitOpenError, LatencyTracker
+
+# Max LLM calls in flight per process (per event loop for async calls)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+
+# Retries on 429 / 5xx / connection errors, with full-jitter exponential backoff
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+
+# HTTP connection pool shared by all calls to a provider
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "32"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+
+PROVIDERS = ("groq", "openai")
+
+# Hedging: duplicate slow calls, to the alternate provider/model when one is given
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+LLM_HEDGE_ALTERNATE = os.getenv("LLM_HEDGE_ALTERNATE", "openai:gpt-4.1-nano")
+
+_CONNECTION_ERRORS = (groq.APIConnectionError, openai.APIConnectionError, httpx.TransportError)
+
+
+def is_retryable(error: Exception) -> bool:
+    """429 and 5xx responses and connection failures are worth another try."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    return isinstance(error, _CONNECTION_ERRORS)
+
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """
+    Seconds to wait before retry `attempt` (0 based): the server's Retry-After when it
+    sends one, else full jitter over an exponentially growing window.
+    """
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_RETRY_MAX_DELAY)
+        except ValueError:
+            pass
+    return random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+def parse_target(value: Optional[str]) -> Optional[tuple]:
+    """'openai:gpt-4.1-nano' -> ('openai', 'gpt-4.1-nano'); empty -> None"""
+    if not value:
+        return None
+    provider, _, model = value.partition(":")
+    return provider.strip(), model.strip()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+class _LoopClients:
+    """Async clients and concurrency limit bound to one event loop."""
+
+    def __init__(self, max_concurrency: int):
+        self.http_client = httpx.AsyncClient(limits=_limits(), timeout=LLM_TIMEOUT)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.clients: Dict[str, Any] = {}
+
+    def get(self, provider: str):
+        client = self.clients.get(provider)
+        if client is None:
+            if provider == "groq":
+                client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), http_client=self.http_client, max_retries=0)
+            else:
+                client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=self.http_client, max_retries=0)
+            self.clients[provider] = client
+        return client
+
+
+class LLMClientPool:
+    """
+    Process-wide access to the Groq and OpenAI chat APIs.
+
+    Async calls share one keep-alive connection pool per event loop (httpx connections
+    cannot move between loops); sync calls from worker threads share one pooled client
+    per provider. Every call goes through a concurrency limit and retries 429 / 5xx
+    responses with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_retries: int = LLM_MAX_RETRIES,
+        hedge_enabled: bool = LLM_HEDGE_ENABLED,
+    ):
+        """
+        Args:
+            max_concurrency: max calls in flight per event loop, and across sync callers
+            max_retries: retries after the first attempt
+            hedge_enabled: False makes hedged_chat_completion a plain call
+        """
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.hedge_enabled = hedge_enabled
+        self.breakers = {provider: CircuitBreaker(provider) for provider in PROVIDERS}
+        self._latencies: Dict[str, LatencyTracker] = {}
+
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopClients]" = weakref.WeakKeyDictionary()
+        self._sync_clients: Dict[str, Any] = {}
+        self._sync_http_client: Optional[httpx.Client] = None
+        self._sync_semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self.failovers = 0
+
+    def _check_provider(self, provider: str):
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unknown LLM provider '{provider}', expected one of {PROVIDERS}.")
+
+    def _loop_clients(self) -> _LoopClients:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._loops.get(loop)
+            if clients is None:
+                clients = self._loops[loop] = _LoopClients(self.max_concurrency)
+            return clients
+
+    def async_client(self, provider: str):
+        """Pooled AsyncGroq / AsyncOpenAI client for the running event loop."""
+        self._check_provider(provider)
+        return self._loop_clients().get(provider)
+
+    def sync_client(self, provider: str):
+        """Pooled Groq / OpenAI client shared by all threads of the process."""
+        self._check_provider(provider)
+        with self._lock:
+            client = self._sync_clients.get(provider)
+            if client is None:
+                if self._sync_http_client is None:
+                    self._sync_http_client = httpx.Client(limits=_limits(), timeout=LLM_TIMEOUT)
+                if provider == "groq":
+                    client = Groq(api_key=os.getenv("GROQ_API_KEY"), http_client=self._sync_http_client, max_retries=0)
+                else:
+                    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=self._sync_http_client, max_retries=0)
+                self._sync_clients[provider] = client
+            return client
+
+    async def chat_completion(
+        self,
+        provider: str,
+        model: str,
+        messages: List[dict],
+        **kwargs: Any,
+    ):
+        """
+        Native async chat completion with concurrency limit and retries.
+        Args:
+            provider: "groq" or "openai"
+            model: model name of that provider
+            messages: chat messages
+            **kwargs: passed to chat.completions.create (temperature, max_tokens, ...)
+
+        Returns: the provider's ChatCompletion response
+        """
+        self._check_provider(provider)
+        loop_clients = self._loop_clients()
+        client = loop_clients.get(provider)
+        breaker = self.breakers[provider]
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow():
+                self.failures += 1
+                raise CircuitOpenError(provider)
+            try:
+                async with loop_clients.semaphore:
+                    self.calls += 1
+                    response = await client.chat.completions.create(model=model, messages=messages, **kwargs)
+                breaker.record_success()
+                return response
+            except asyncio.CancelledError:
+                breaker.record_cancelled()
+                raise
+            except Exception as e:
+                if is_retryable(e):
+                    breaker.record_failure()
+                else:
+                    breaker.record_cancelled()
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                delay = retry_delay(e, attempt)
+                print(f"⚠️ {provider} call failed ({e}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def chat_completion_sync(
+        self,
+        provider: str,
+        model: str,
+        messages: List[dict],
+        **kwargs: Any,
+    ):
+        """
+        Blocking version of chat_completion for callers on worker threads.
+        """
+        client = self.sync_client(provider)
+        breaker = self.breakers[provider]
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow():
+                self.failures += 1
+                raise CircuitOpenError(provider)
+            try:
+                with self._sync_semaphore:
+                    self.calls += 1
+                    response = client.chat.completions.create(model=model, messages=messages, **kwargs)
+                breaker.record_success()
+                return response
+            except Exception as e:
+                if is_retryable(e):
+                    breaker.record_failure()
+                else:
+                    breaker.record_cancelled()
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                delay = retry_delay(e, attempt)
+                print(f"⚠️ {provider} call failed ({e}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+    def _latency(self, hedge_key: Optional[str], target: tuple) -> LatencyTracker:
+        # One window per kind of call and provider: a fallback provider's latencies never set the primary's hedge delay
+        key = f"{hedge_key}:{target[0]}:{target[1]}" if hedge_key else f"{target[0]}:{target[1]}"
+        with self._lock:
+            tracker = self._latencies.get(key)
+            if tracker is None:
+                tracker = self._latencies[key] = LatencyTracker()
+            return tracker
+
+    async def _timed_completion(self, target: tuple, hedge_key: Optional[str], messages: List[dict], kwargs: dict):
+        tracker = self._latency(hedge_key, target)
+        start = time.monotonic()
+        response = await self.chat_completion(target[0], target[1], messages, **kwargs)
+        tracker.record(time.monotonic() - start)
+        return response
+
+    async def hedged_chat_completion(
+        self,
+        provider: str,
+        model: str,
+        messages: List[dict],
+        alternate: Optional[tuple] = None,
+        hedge_key: Optional[str] = None,
+        **kwargs: Any,
+    ):
+        """
+        chat_completion with a hedge: when the first call is slower than the recent latency
+        percentile of `hedge_key` calls to that provider (or fails), a duplicate goes to
+        `alternate` (or the same provider) and the first good answer wins. Providers with an
+        open circuit are skipped.
+        Args:
+            provider: primary provider
+            model: primary model
+            messages: chat messages
+            alternate: optional (provider, model) for the duplicate, e.g. ("openai", "gpt-4.1-nano")
+            hedge_key: name of this kind of call for latency tracking, e.g. "guardrail"
+            **kwargs: passed to chat.completions.create
+
+        Returns: the winning ChatCompletion response
+        """
+        primary = (provider, model)
+        hedge = alternate or primary
+        if self.breakers[primary[0]].state == "open" and self.breakers[hedge[0]].state != "open":
+            # Primary keeps failing: go straight to the alternate
+            self.failovers += 1
+            primary = hedge
+        if not self.hedge_enabled:
+            return await self._timed_completion(primary, hedge_key, messages, kwargs)
+
+        # None until the primary has enough samples: only a failure sends the duplicate then
+        delay = self._latency(hedge_key, primary).hedge_delay()
+        pending = {asyncio.create_task(self._timed_completion(primary, hedge_key, messages, kwargs))}
+        hedge_task = None
+        last_error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=None if hedge_task or delay is None else delay,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge_task:
+                            self.hedges_won += 1
+                        return task.result()
+                    last_error = task.exception()
+
+                if hedge_task is None and (not done or not pending):
+                    # First call is slower than usual, or failed: send the duplicate
+                    self.hedges_sent += 1
+                    hedge_task = asyncio.create_task(self._timed_completion(hedge, hedge_key, messages, kwargs))
+                    pending.add(hedge_task)
+        finally:
+            for task in pending:
+                task.cancel()
+        raise last_error
+
+    async def aclose_loop(self):
+        """Close the connection pool of the running event loop (call before closing the loop)."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._loops.pop(loop, None)
+        if clients is not None:
+            await clients.http_client.aclose()
+
+    def close(self):
+        """Close the pooled sync clients (worker shutdown)."""
+        with self._lock:
+            http_client, self._sync_http_client = self._sync_http_client, None
+            self._sync_clients.clear()
+        if http_client is not None:
+            http_client.close()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won,
+            "failovers": self.failovers,
+            "breakers": {provider: breaker.stats() for provider, breaker in self.breakers.items()},
+            "event_loops": len(self._loops),
+        }
+
+
+# Shared by every caller in the process
+llm_clients = LLMClientPool()
+
+# Where hedged Groq calls send their duplicate
+hedge_alternate = parse_target(LLM_HEDGE_ALTERNATE)
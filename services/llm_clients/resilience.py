@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+# Consecutive failures that open a provider's circuit, and seconds before a probe call is let through
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# A duplicate request is sent once the first one is slower than this percentile of recent latencies.
+# Until a provider has LLM_HEDGE_MIN_SAMPLES latencies only failed calls are duplicated.
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.2"))
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a provider whose circuit breaker is open
+    """
+    def __init__(self, provider):
+        super().__init__(f"Circuit open for LLM provider '{provider}'")
+        self.provider = provider
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker.
+
+    closed: calls go through. After `failure_threshold` consecutive failures the circuit
+    opens and calls are refused for `reset_seconds`; then it is half open and a single
+    probe call decides whether it closes again or stays open.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = LLM_BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = LLM_BREAKER_RESET_SECONDS,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may be sent now (claims the probe slot when half open)."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            failed_probe = self._probe_in_flight
+            self._probe_in_flight = False
+            if failed_probe or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self.times_opened += 1
+                print(f"🚧 Circuit opened for LLM provider '{self.name}' after {self._failures} failures")
+
+    def record_cancelled(self):
+        """A call was abandoned (e.g. it lost a hedge race): free the probe slot without a verdict."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self._state(), "consecutive_failures": self._failures, "times_opened": self.times_opened}
+
+
+class LatencyTracker:
+    """
+    Sliding window of recent successful call latencies for one kind of call to one provider.
+    """
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percentile: float):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait for the first request before sending a duplicate, None while too few samples exist."""
+        with self._lock:
+            enough = len(self._samples) >= LLM_HEDGE_MIN_SAMPLES
+        if not enough:
+            return None
+        return max(self.percentile(LLM_HEDGE_PERCENTILE), LLM_HEDGE_MIN_DELAY)
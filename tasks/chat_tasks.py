@@ -1,36 +1,179 @@
-from concurrent.futures import ThreadPoolExecutor
 from celery import current_app as celery_app
 from datetime import datetime, timedelta
 import time
 import asyncio
 from sqlalchemy.orm import Session
 from databases.my_sql.user_table import User
-from services.gaurdrails_groq.groq_guardrails import GroqGuardrail, GroqInputGuardrailTriggeredException
+from services.category_classifier.embedding_classifier import CATEGORY_CLASSIFIER_ENABLED, EmbeddingCategoryClassifier
+from services.llm_clients.llm_client import llm_clients
+from services.gaurdrails_groq.groq_guardrails import GroqGuardrail, GroqInputGuardrailTriggeredException, verdict_cache
+from tasks.signatures import PROCESS_CHAT_TASK
+from tasks.worker_runtime import worker_runtime
 from tot.tot_integration import TotRagIntegration
 from utils.db.chat_count import update_chat_counter
 from utils.db.connect_to_my_sql import SessionLocal
 from utils.db.user_utils import reset_cross_limit_if_expired, check_and_update_premium_status
 from utils.retrivers.retreiver import AutomergingRetriverInit
 from utils.retrivers.retriver_init import get_data_sources
+from utils.task_results.chat_events import ChatEventPublisher
+from utils.task_results.single_flight import CHAT_SINGLE_FLIGHT_ATTEMPTS, COALESCED_STATUS, ChatSingleFlight
 from utils.tools.tool_support_functions import clean_response_text
 import utils.file_server.fileserver as fileserver
 
 
-storage_contexts, embed_model = get_data_sources()
-auto_merging_retriever = AutomergingRetriverInit(storage_contexts, embed_model)
+index_dirs, embed_model = get_data_sources()
+auto_merging_retriever = AutomergingRetriverInit(index_dirs, embed_model)
+category_classifier = EmbeddingCategoryClassifier(embed_model, index_dirs)
+# Chunk centroids follow the index snapshots the retriever swaps in
+auto_merging_retriever.add_version_listener(category_classifier.invalidate)
+single_flight = ChatSingleFlight()
 
+# Characters of statute text returned by the citation fast path
+CITATION_EXCERPT_CHARS = 1500
+
+
+def build_citation_response(citation: dict, nodes: list) -> dict:
+    """
+    Build the chat result for a direct citation lookup from the chunk where the section starts.
+    Args:
+        citation: output of AutomergingRetriverInit.lookup_citation
+        nodes: chunks of the section, in index order
+
+    Returns: result dict in the same shape as the full pipeline
+
+    """
+    entry = citation["entries"][0]
+    node = next((n for n in nodes if n.node_id == entry["node_id"]), nodes[0])
+    excerpt = node.get_content()[entry.get("offset", 0):][:CITATION_EXCERPT_CHARS]
+    excerpt = " ".join(excerpt.split())
+
+    category = citation["category"]
+    file_name = node.metadata.get("source_file") or citation["source_file"]
+    page_number = node.metadata.get("page_number") or entry.get("page_number")
+    links = []
+    link = fileserver.generate_download_link(category=category, file_name=file_name)
+    if link and page_number:
+        links.append({"title": file_name, "page": page_number, "link": link})
+
+    message = f"Section {citation['section']} of the {citation['act'].title()} (page {page_number}):\n{excerpt}"
+    return {
+        "message": clean_response_text(message),
+        "links": links,
+        "timestamp": datetime.utcnow().isoformat(),
+        "status": "success",
+        "index_version": citation.get("index_version"),
+    }
+
+
+async def answer_query(query: str, category: str, events: ChatEventPublisher) -> dict:
+    """
+    Retrieval, links and ToT answer for a routed query (steps 2-4 of process_chat).
+    Runs on the worker loop.
+    Args:
+        query: user query
+        category: category chosen by the router
+        events: publisher of the /chat/stream events
+
+    Returns: result dict with the step timings
+    """
+    loop = asyncio.get_running_loop()
+    executor = worker_runtime.executor
+
+    # Step 2: Retrieve
+    automerge_start = time.time()
+    automerge_task = loop.run_in_executor(
+        executor,
+        auto_merging_retriever.retrieve_with_version,
+        query,
+        category
+    )
+    retrieved_nodes, index_version = await automerge_task
+    automerge_time = time.time() - automerge_start
+
+    # Step 3: Build links (streamed before the ToT search starts)
+    links = []
+    for node in retrieved_nodes:
+        metadata = getattr(node, "metadata", {}) or getattr(node, "metadata_dict", {})
+        if not isinstance(metadata, dict):
+            continue
+
+        file_name = metadata.get("source_file")
+        page_number = metadata.get("page_number")
+
+        if file_name and page_number:
+            link = fileserver.generate_download_link(category=category, file_name=file_name)
+            links.append({
+                "title": file_name,
+                "page": page_number,
+                "link": link
+            })
+
+    events.publish("links", links)
+    events.progress("reasoning")
+
+    # Step 4: ToT Enhancement (the limits below are upper bounds, the adaptive controller spends less)
+    tot_start = time.time()
+    tot_rag = TotRagIntegration(
+        threshold=0.8,
+        max_loops=3,
+        prune_threshold=0.5,
+        number_of_agents=3,
+        use_openai_caller=False,
+        embed_model=embed_model
+    )
+    text_nodes = [node for node in retrieved_nodes if hasattr(node, "text")]
+    node_texts = [node.text for node in text_nodes]
+    # The local scorer reuses the chunk vectors already stored in the index
+    chunk_vectors = auto_merging_retriever.stored_vectors(
+        category, [node.node_id for node in text_nodes], index_version
+    )
+    enhanced_response = await tot_rag.enhance_response(query, node_texts, chunk_vectors)
+    tot_time = time.time() - tot_start
+    timings = {
+        "automerge_duration": round(automerge_time, 2),
+        "tot_duration": round(tot_time, 2),
+        "tot_llm_calls": tot_rag.memo.calls_made,
+        "tot_saved_calls": tot_rag.memo.calls_saved,
+        "tot_budget": tot_rag.budget_used(),
+    }
+
+    message = clean_response_text(enhanced_response)
+    events.answer(message)
+
+    return {
+        "message": message,
+        "links": links,
+        "timestamp": datetime.utcnow().isoformat(),
+        "status": "success",
+        "timings": timings,
+        "index_version": index_version
+    }
+
+
+@celery_app.task(bind=True, name=PROCESS_CHAT_TASK)
+def process_chat(self, query, email: str, stream: bool = False, attempt: int = 0):
+    """
+    stream=True publishes progress, links and answer events for /chat/stream (ChatEventPublisher).
+    Identical concurrent queries are routed and answered once (ChatSingleFlight): a duplicate
+    returns a COALESCED_STATUS pointer to the leader task, which the API follows.
+    attempt counts the resubmissions of a duplicate whose leader failed.
+    """
+    # Leaders always publish: streaming duplicates relay the leader's events
+    events = ChatEventPublisher(self.request.id, enabled=stream or single_flight.enabled)
+
+    def finish(result: dict) -> dict:
+        events.done(result)
+        return result
 
-@celery_app.task(bind=True)
-def process_chat(self, query, email: str):
     db: Session = SessionLocal()  # ✅ Initialize DB inside task
     try:
         user = db.query(User).filter(User.email == email).first()
         if not user:
-            return {
+            return finish({
                 "status": "error",
                 "error": "User not found",
                 "timestamp": datetime.utcnow().isoformat()
-            }
+            })
 
         # ✅ Check premium expiry
         user = check_and_update_premium_status(user, db)
@@ -40,29 +183,81 @@ def process_chat(self, query, email: str):
             user = reset_cross_limit_if_expired(user, db)
             if user.is_cross_limit_per_day:
                 print("❌ OverLimit triggered")
-                return {
+                return finish({
                     "status": "over limit",
                     "error": f"User limit is over until {user.expired_at}.",
                     "links": [],
                     "timestamp": datetime.utcnow().isoformat(),
                     "timings": {}
-                }
+                })
 
         overall_start_time = time.time()
         timings = {}
 
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        # Fast path: "section 294 of the Penal Code" is answered straight from the section index
+        citation_start = time.time()
+        citation_hit = auto_merging_retriever.lookup_citation(query)
+        if citation_hit:
+            result = build_citation_response(*citation_hit)
+            result["timings"] = {
+                "citation_lookup_duration": round(time.time() - citation_start, 3),
+                "total_duration": round(time.time() - overall_start_time, 3),
+            }
+            print(f"⚡ Citation fast path: section {citation_hit[0]['section']} of {citation_hit[0]['act']}")
+            events.publish("links", result["links"])
+            events.answer(result["message"])
+            return finish(result)
 
-        executor = ThreadPoolExecutor(max_workers=15)
+        # Claimed before routing, so duplicates cost neither guardrail/classifier passes nor
+        # a worker slot while the leader runs
+        flight_key = None
+        if single_flight.enabled and attempt < CHAT_SINGLE_FLIGHT_ATTEMPTS:
+            flight_key = ChatSingleFlight.key(query, auto_merging_retriever.serving_fingerprint())
+            claim = worker_runtime.run(single_flight.claim(flight_key, self.request.id))
+            if claim is not None and claim["result"] is not None:
+                print(f"🤝 Served the result of task {claim['leader']}")
+                result = {**claim["result"], "timings": {
+                    "coalesced_with": claim["leader"],
+                    "total_duration": round(time.time() - overall_start_time, 3),
+                }}
+                events.publish("links", result["links"])
+                events.answer(result["message"])
+                return finish(result)
+            if claim is not None:
+                print(f"🤝 Coalesced with in-flight task {claim['leader']}")
+                return finish({
+                    "status": COALESCED_STATUS,
+                    "leader_task_id": claim["leader"],
+                    "query": query,
+                    "attempt": attempt,
+                    "timestamp": datetime.utcnow().isoformat(),
+                })
 
         async def run_chat_pipeline():
+            # Worker-lifetime loop and bounded executor (tasks/worker_runtime.py)
+            loop = asyncio.get_running_loop()
+            executor = worker_runtime.executor
             try:
-                # Step 1: Guardrail classification
-                guardrail = GroqGuardrail()
+                # Step 1: Category routing - local embedding classifier first, Groq guardrails when unsure
                 agent_start = time.time()
-                agent_task = loop.run_in_executor(executor, guardrail.run_guardrail, query)
-                category_output = await agent_task
+                events.progress("routing")
+                route = None
+                if CATEGORY_CLASSIFIER_ENABLED:
+                    route = await loop.run_in_executor(executor, category_classifier.classify, query)
+
+                if route and route["routable"]:
+                    category_output = {
+                        "relevancy": "relevant",
+                        "category": route["category"],
+                        "reasoning": f"Embedding classifier (confidence {route['confidence']})",
+                    }
+                    timings["routed_by"] = "local"
+                else:
+                    guardrail = GroqGuardrail()
+                    category_output = await guardrail.arun_guardrail(query)
+                    timings["routed_by"] = "groq"
+                if route:
+                    timings["classifier_confidence"] = route["confidence"]
                 agent_time = time.time() - agent_start
 
                 category = category_output.get("category")
@@ -75,64 +270,15 @@ def process_chat(self, query, email: str):
                         "timings": {}
                     }
 
-                # Step 2: Retrieve
-                automerge_start = time.time()
-                automerge_task = loop.run_in_executor(
-                    executor,
-                    auto_merging_retriever.automerging_retrival_pipeline,
-                    query,
-                    category
-                )
-                retrieved_nodes = await automerge_task
-                automerge_time = time.time() - automerge_start
-
-                # Step 3: ToT Enhancement
-                tot_start = time.time()
-                tot_rag = TotRagIntegration(
-                    threshold=0.8,
-                    max_loops=3,
-                    prune_threshold=0.5,
-                    number_of_agents=3,
-                    use_openai_caller=False
-                )
-                node_texts = [
-                    node.text for node in retrieved_nodes if hasattr(node, "text")
-                ]
-                enhanced_response = await tot_rag.enhance_response(query, node_texts)
-                tot_time = time.time() - tot_start
-
-                # Step 4: Build links
-                links = []
-                for node in retrieved_nodes:
-                    metadata = getattr(node, "metadata", {}) or getattr(node, "metadata_dict", {})
-                    if not isinstance(metadata, dict):
-                        continue
-
-                    file_name = metadata.get("source_file")
-                    page_number = metadata.get("page_number")
-
-                    if file_name and page_number:
-                        link = fileserver.generate_download_link(category=category, file_name=file_name)
-                        links.append({
-                            "title": file_name,
-                            "page": page_number,
-                            "link": link
-                        })
+                events.progress("retrieving", category=category)
 
+                result = await answer_query(query, category, events)
+                timings.update(result["timings"])
                 timings.update({
-                    "automerge_duration": round(automerge_time, 2),
                     "agent_duration": round(agent_time, 2),
-                    "tot_duration": round(tot_time, 2),
                     "total_duration": round(time.time() - overall_start_time, 2)
                 })
-
-                return {
-                    "message": clean_response_text(enhanced_response),
-                    "links": links,
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "status": "success",
-                    "timings": timings
-                }
+                return {**result, "timings": timings}
 
             except GroqInputGuardrailTriggeredException:
                 return {
@@ -143,24 +289,35 @@ def process_chat(self, query, email: str):
                     "timings": {}
                 }
 
-        result = loop.run_until_complete(run_chat_pipeline())
+        if flight_key is None:
+            result = worker_runtime.run(run_chat_pipeline())
+        else:
+            result = worker_runtime.run(single_flight.lead(flight_key, self.request.id, run_chat_pipeline))
 
         print("===================================================")
         print(f"✅ Total response time: {result.get('timings', {}).get('total_duration', 'N/A')} seconds")
         print("⏱️ Timings:", result["timings"])
+        print("🗂️ Index version:", result.get("index_version"))
+        print("📦 Index registry:", auto_merging_retriever.registry_stats())
+        print("🧮 Embedding cache:", embed_model.cache_stats())
+        print("🧭 Category classifier:", category_classifier.stats())
+        print("🛡️ Guardrail verdict cache:", verdict_cache.stats())
+        print("🔌 LLM clients:", llm_clients.stats())
+        print("🤝 Single flight:", single_flight.stats())
+        print("🔁 Worker runtime:", worker_runtime.stats())
         print("===================================================")
 
         # if result["status"] == "success":
             # update_chat_counter(user, db)
 
-        return result
+        return finish(result)
 
     except Exception as e:
         print(f"❌ Error in process_chat: {e}")
-        return {
+        return finish({
             "status": "error",
             "error": str(e),
             "timestamp": datetime.utcnow().isoformat()
-        }
+        })
     finally:
         db.close()  # ✅ Always close DB session
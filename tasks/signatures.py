@@ -0,0 +1,31 @@
+from celery_app import celery_app
+
+# Task names shared by the API and the worker. The API dispatches by name so that it
+# never imports tasks.chat_tasks (which loads the embedding model and the indexes).
+PROCESS_CHAT_TASK = "tasks.chat_tasks.process_chat"
+CHAT_QUEUE = "chat_queue"
+
+
+def submit_chat(query: str, email: str, stream: bool = False, attempt: int = 0):
+    """
+    Enqueue process_chat for the Celery worker.
+    Args:
+        query: user query
+        email: user email
+        stream: publish progress events for /chat/stream
+        attempt: resubmissions of a coalesced chat whose leader failed (ChatSingleFlight)
+
+    Returns: AsyncResult of the queued task (only its id is used, results are awaited with result_waiter)
+    """
+    task = celery_app.send_task(
+        PROCESS_CHAT_TASK,
+        args=[query, email],
+        kwargs={"stream": stream, "attempt": attempt},
+        queue=CHAT_QUEUE,
+    )
+    # The redis backend subscribes this process to celery-task-meta-<id> on submit and only
+    # unsubscribes from AsyncResult.get(), which the API never calls: release it right away
+    result_consumer = getattr(celery_app.backend, "result_consumer", None)
+    if result_consumer is not None:
+        result_consumer.cancel_for(task.id)
+    return task
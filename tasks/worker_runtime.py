@@ -0,0 +1,106 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional
+
+from celery.signals import worker_process_init, worker_process_shutdown
+
+from services.llm_clients.llm_client import llm_clients
+
+# Threads for blocking pipeline steps (classifier, retrieval, embeddings) in one worker process
+CHAT_WORKER_EXECUTOR_THREADS = int(os.getenv("CHAT_WORKER_EXECUTOR_THREADS", "8"))
+
+
+class WorkerRuntime:
+    """
+    Worker-lifetime resources for process_chat: one event loop running in a background
+    thread and one bounded executor. Tasks submit their coroutine to the loop, so the
+    pooled LLM connections of that loop are reused from task to task.
+
+    Started from worker_process_init (and lazily, e.g. for the solo pool or after a
+    fork), stopped from worker_process_shutdown.
+    """
+
+    def __init__(self, executor_threads: int = CHAT_WORKER_EXECUTOR_THREADS):
+        """
+        Args:
+            executor_threads: max threads of the shared executor
+        """
+        self.executor_threads = executor_threads
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.tasks_run = 0
+
+    def ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            # Threads do not survive a fork: a child builds its own loop and executor
+            self._pid = os.getpid()
+            self.executor = ThreadPoolExecutor(max_workers=self.executor_threads, thread_name_prefix="chat-worker")
+            self.loop = asyncio.new_event_loop()
+            self.loop.set_default_executor(self.executor)
+            self._thread = threading.Thread(target=self.loop.run_forever, name="chat-worker-loop", daemon=True)
+            self._thread.start()
+            print(f"🔁 Worker runtime started (pid {self._pid}, {self.executor_threads} executor threads)")
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """
+        Run a coroutine on the worker loop and block the calling task until it finishes.
+        Args:
+            coro: coroutine to run
+            timeout: seconds to wait, None waits until it finishes
+
+        Returns: the coroutine's result
+        """
+        self.ensure_started()
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            result = future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+        self.tasks_run += 1
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                return
+            loop, thread, executor = self.loop, self._thread, self.executor
+            self.loop = self._thread = self.executor = None
+
+        # The LLM connection pool is bound to this loop
+        asyncio.run_coroutine_threadsafe(llm_clients.aclose_loop(), loop).result(timeout=10)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=10)
+        loop.close()
+        executor.shutdown(wait=True)
+        llm_clients.close()
+        print(f"🛑 Worker runtime stopped after {self.tasks_run} tasks")
+
+    def stats(self) -> dict:
+        return {
+            "pid": self._pid,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "executor_threads": self.executor_threads,
+            "threads": threading.active_count(),
+            "tasks_run": self.tasks_run,
+        }
+
+
+worker_runtime = WorkerRuntime()
+
+
+@worker_process_init.connect
+def start_worker_runtime(**kwargs):
+    worker_runtime.ensure_started()
+
+
+@worker_process_shutdown.connect
+def stop_worker_runtime(**kwargs):
+    worker_runtime.shutdown()
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+for module in ("openai", "swarms", "loguru", "dotenv"):
+    pytest.importorskip(module)
+
+from tot.dfs import ToTDFSAgent
+
+
+class ScriptedAgent:
+    """Stands in for TotAgent: records the n of every expansion and scores thoughts by depth."""
+
+    def __init__(self, evaluation_by_depth):
+        self.evaluation_by_depth = evaluation_by_depth
+        self.requested = []
+
+    async def run_counted(self, task, n=1):
+        depth = task.count("/")
+        self.requested.append(n)
+        evaluation = self.evaluation_by_depth[min(depth, len(self.evaluation_by_depth) - 1)]
+        return [{"thought": f"{task}/{i}", "evaluation": evaluation} for i in range(n)], 1
+
+    def expandable(self, thought):
+        return True
+
+
+def run_search(agent):
+    search = ToTDFSAgent(agent, threshold=0.8, max_loops=3, prune_threshold=0.5, number_of_agents=3, adaptive=True)
+    asyncio.run(search.dfs("q"))
+    return search
+
+
+def test_good_probe_shrinks_later_expansions():
+    # The single root sample clears the threshold but not the confidence margin
+    agent = ScriptedAgent([0.82, 0.85, 0.88])
+    search = run_search(agent)
+
+    assert agent.requested == [1, 1, 1]
+    report = search.budget_used()
+    assert report["thoughts_per_expansion"] == 1
+    assert report["llm_calls"] == 3
+    assert report["full_tree_llm_calls"] == 1 + 3 + 9
+
+
+def test_weak_probe_keeps_full_width():
+    agent = ScriptedAgent([0.6, 0.65, 0.7])
+    search = run_search(agent)
+
+    # Probe, the two remaining root samples, then 3 thoughts per expansion
+    assert agent.requested[:2] == [1, 2]
+    assert set(agent.requested[2:]) == {3}
+    assert search.budget_used()["thoughts_per_expansion"] == 3
@@ -0,0 +1,45 @@
+from utils.retrivers.index_registry import IndexRegistry, LoadedCategoryIndex
+
+MB = 1024 * 1024
+
+
+def make_registry(max_mb):
+    def load(category):
+        return LoadedCategoryIndex(category=category, index=None, retriever=None, nbytes=MB, load_seconds=0.0, version="v1")
+
+    return IndexRegistry(load, max_mb=max_mb)
+
+
+def test_replace_marks_the_category_most_recently_used():
+    registry = make_registry(max_mb=2)
+    registry.get("a")
+    registry.get("b")
+
+    fresh = LoadedCategoryIndex(category="a", index=None, retriever=None, nbytes=MB, load_seconds=0.0, version="v2")
+    assert registry.replace("a", fresh)
+    registry.get("c")
+
+    assert registry.stats()["resident_categories"] == ["a", "c"]
+    assert registry.resident_version("a") == "v2"
+    assert registry.evictions == 1
+
+
+def test_growing_replace_evicts_every_stale_entry():
+    registry = make_registry(max_mb=3)
+    for category in ("a", "b", "c"):
+        registry.get(category)
+
+    bigger = LoadedCategoryIndex(category="a", index=None, retriever=None, nbytes=2 * MB, load_seconds=0.0, version="v2")
+    assert registry.replace("a", bigger)
+
+    assert registry.stats()["resident_categories"] == ["c", "a"]
+    assert registry.evictions == 1
+
+
+def test_replace_skips_categories_that_are_not_resident():
+    registry = make_registry(max_mb=2)
+    registry.get("a")
+
+    fresh = LoadedCategoryIndex(category="b", index=None, retriever=None, nbytes=MB, load_seconds=0.0, version="v2")
+    assert not registry.replace("b", fresh)
+    assert registry.resident_version("b") is None
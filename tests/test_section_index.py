@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip("llama_index.core")
+
+from llama_index.core.schema import TextNode
+
+from utils.retrivers.section_index import SectionIndex, find_section_headings, parse_direct_citation
+
+
+def test_headings_with_and_without_marginal_notes():
+    text = (
+        "169. If the alteration ...\n"
+        "4.Where any person ...\n"
+        "238A. (1) At the ...\n"
+        "Murder. 294. Except ...\n"
+        "Hurt. 310. Whoever ...\n"
+        "Culpable homicide not amounting to murder. 293. Whoever ...\n"
+    )
+    assert [section for section, _ in find_section_headings(text)] == ["169", "4", "238A", "294", "310", "293"]
+
+
+@pytest.mark.parametrize("line", [
+    "The Act No. 5. blah",
+    "Rs. 500. fine",
+    "Cap. 19. Penal",
+    "The fine is Rs. 500. If unpaid",
+])
+def test_abbreviations_are_not_marginal_notes(line):
+    assert find_section_headings(line) == []
+
+
+def test_citation_serves_the_real_heading():
+    node = TextNode(
+        text="The Act No. 5. blah\nRs. 300. fine\nMurder. 300. Except in the cases hereinafter excepted ...",
+        metadata={"source_file": "Penal-Code-Consolidated2024.pdf", "page_number": 71},
+    )
+    citation = parse_direct_citation("section 300 of the penal code", SectionIndex.build([node]))
+
+    assert citation["act"] == "penal code"
+    assert len(citation["entries"]) == 1
+    entry = citation["entries"][0]
+    assert node.get_content()[entry["offset"]:].startswith("300. Except")
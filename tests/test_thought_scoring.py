@@ -0,0 +1,64 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+for module in ("openai", "dotenv"):
+    pytest.importorskip(module)
+
+import tot.agent as agent_module
+from tot.agent import TOT_FALLBACK_EVALUATION, TotAgent
+
+
+class FakeClients:
+    def __init__(self, content):
+        self.content = content
+
+    async def hedged_chat_completion(self, provider, model, messages, **kwargs):
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class FixedScorer:
+    ready = True
+
+    def __init__(self, score):
+        self.fixed = score
+
+    def score(self, thoughts):
+        return [self.fixed] * len(thoughts)
+
+    def keeps(self, local_score):
+        return True
+
+
+def run(monkeypatch, content, scorer=None, n=1):
+    monkeypatch.setattr(agent_module, "llm_clients", FakeClients(content))
+    return asyncio.run(TotAgent(scorer=scorer).run("state", n=n))
+
+
+def test_unparsable_evaluation_uses_local_score(monkeypatch):
+    thoughts = run(monkeypatch, "not a dict at all", scorer=FixedScorer(0.12))
+
+    assert thoughts[0]["evaluation"] == 0.12
+    assert thoughts[0]["evaluation"] != TOT_FALLBACK_EVALUATION
+
+
+def test_unparsable_evaluation_ranks_below_grounded_thought(monkeypatch):
+    unparsable = run(monkeypatch, "rambling text", scorer=FixedScorer(0.1))[0]
+    parsed = run(monkeypatch, "{'thought': 'grounded', 'evaluation': 0.3}", scorer=FixedScorer(0.1))[0]
+
+    assert unparsable["evaluation"] < parsed["evaluation"]
+
+
+def test_parsed_evaluation_is_kept(monkeypatch):
+    thoughts = run(monkeypatch, "{'thought': 'ok', 'evaluation': 0.9}", scorer=FixedScorer(0.1))
+
+    assert thoughts[0]["evaluation"] == 0.9
+    assert thoughts[0]["local_score"] == 0.1
+
+
+def test_fallback_without_scorer(monkeypatch):
+    thoughts = run(monkeypatch, "not a dict at all")
+
+    assert thoughts[0]["evaluation"] == TOT_FALLBACK_EVALUATION
@@ -0,0 +1,126 @@
+import os
+from typing import Any, Dict, List, Optional
+
+TOT_ADAPTIVE = os.getenv("TOT_ADAPTIVE", "true").lower() == "true"
+
+# Stop as soon as a thought scores at least threshold + this margin
+TOT_CONFIDENCE_MARGIN = float(os.getenv("TOT_CONFIDENCE_MARGIN", "0.1"))
+
+# A level whose best evaluation improves on the previous level by less than this is a plateau
+TOT_PLATEAU_DELTA = float(os.getenv("TOT_PLATEAU_DELTA", "0.02"))
+
+
+class AdaptiveSearchController:
+    """
+    Decides how much of the ToT search budget a request actually spends.
+
+    - the root is probed with a single sample; if that sample already clears the
+      threshold the search continues with one thought per expansion instead of n
+    - the search stops once a thought clears threshold + confidence_margin
+    - a branch whose best child does not improve on its parent's evaluation (a plateau
+      across the level) is not expanded further
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        number_of_agents: int,
+        max_loops: int,
+        confidence_margin: float = TOT_CONFIDENCE_MARGIN,
+        plateau_delta: float = TOT_PLATEAU_DELTA,
+    ):
+        """
+        Args:
+            threshold: evaluation a thought needs to be accepted as the answer
+            number_of_agents: thoughts per expansion (one LLM call) when the search is not shrunk
+            max_loops: max depth of the search
+            confidence_margin: margin above threshold that stops the whole search
+            plateau_delta: minimum improvement over the parent needed to keep descending
+        """
+        self.threshold = threshold
+        self.number_of_agents = number_of_agents
+        self.max_loops = max_loops
+        self.confidence_margin = confidence_margin
+        self.plateau_delta = plateau_delta
+
+        self.n = number_of_agents
+        self.best_by_level: Dict[int, float] = {}
+        self.plateaus = 0
+        self.stop_reason: Optional[str] = None
+        self.llm_calls = 0
+        self.expansions = 0
+
+    @property
+    def stopped(self) -> bool:
+        return self.stop_reason is not None
+
+    @property
+    def converged(self) -> bool:
+        """Stopped, or some branch plateaued: further re-chaining is not worth its calls."""
+        return self.stopped or self.plateaus > 0
+
+    def probe_first(self) -> bool:
+        """Whether the next expansion is the root and should be probed with one sample."""
+        return self.expansions == 0 and self.number_of_agents > 1
+
+    def probe(self, thoughts: List[Dict[str, Any]]) -> bool:
+        """
+        Look at the single root sample. Returns True when it is good enough that the
+        remaining samples are skipped and later expansions ask for one thought only.
+        """
+        if thoughts and thoughts[0]["evaluation"] >= self.threshold:
+            self.n = 1
+            print(f"🎯 ToT probe scored {thoughts[0]['evaluation']}, shrinking expansions to 1 thought")
+            return True
+        return False
+
+    def record(
+        self,
+        step: int,
+        thoughts: List[Dict[str, Any]],
+        calls: int,
+        parent_evaluation: Optional[float] = None,
+    ) -> bool:
+        """
+        Record an expansion at depth `step` that sent `calls` LLM calls
+        (0 when the memo served it, so llm_calls matches the calls really made).
+
+        Returns: whether the resulting thoughts are worth expanding further
+        """
+        self.llm_calls += calls
+        self.expansions += 1
+        if not thoughts:
+            return False
+
+        best = max(thought["evaluation"] for thought in thoughts)
+        self.best_by_level[step] = max(best, self.best_by_level.get(step, float("-inf")))
+        if best >= self.threshold + self.confidence_margin:
+            if not self.stopped:
+                self.stop_reason = "confident"
+            return False
+        if parent_evaluation is not None and best < parent_evaluation + self.plateau_delta:
+            self.plateaus += 1
+            return False
+        return not self.stopped
+
+    def report(self) -> dict:
+        # number_of_agents ** level expansions per level, one call each
+        full_tree_calls = sum(self.number_of_agents ** level for level in range(self.max_loops))
+        best = max(self.best_by_level.values(), default=None)
+        if self.stop_reason:
+            stop_reason = self.stop_reason
+        elif best is not None and best > self.threshold:
+            stop_reason = "threshold"
+        elif self.plateaus:
+            stop_reason = "plateau"
+        else:
+            stop_reason = "exhausted"
+        return {
+            "llm_calls": self.llm_calls,
+            "full_tree_llm_calls": full_tree_calls,
+            "thoughts_per_expansion": self.n,
+            "levels": len(self.best_by_level),
+            "best_by_level": {level: round(best, 3) for level, best in sorted(self.best_by_level.items())},
+            "plateaued_branches": self.plateaus,
+            "stop_reason": stop_reason,
+        }
@@ -1,16 +1,24 @@
 import os
 import uuid
 import asyncio
-from groq import Groq
 import openai
-from openai import AsyncOpenAI
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from dotenv import load_dotenv
 import ast
 
+from services.llm_clients.llm_client import hedge_alternate, llm_clients
+from tot.local_scorer import LocalThoughtScorer
+from tot.thought_memo import ThoughtMemo
+
 load_dotenv()
 
+GROQ_TOT_MODEL = "llama-3.3-70b-versatile"
+TOT_SAMPLE_TEMPERATURE = 0.1
+
+# Evaluation of a thought whose self evaluation could not be parsed, when no local scorer is prepared
+TOT_FALLBACK_EVALUATION = 0.5
+
 
 def string_to_dict(thought_string):
     return ast.literal_eval(thought_string)
@@ -72,6 +80,9 @@ class TotAgent:
         model: str = "gpt-4.1-nano",
         temperature: float = 0.3,
         max_tokens: int = 4096,
+        use_openai_caller: bool = False,
+        memo: Optional[ThoughtMemo] = None,
+        scorer: Optional[LocalThoughtScorer] = None,
         *args,
         **kwargs,
     ):
@@ -79,48 +90,108 @@ class TotAgent:
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.use_openai_caller = use_openai_caller
+        self.memo = memo  # per-request memo of expansions, None disables it
+        self.scorer = scorer  # local pruning gate for thoughts, None expands on the LLM evaluation only
         openai.api_key = os.getenv("OPENAI_API_KEY")
 
     async def run(self, task: str, n: int = 1) -> List[Dict[str, Any]]:
         """
-        Generate `n` thoughts concurrently using OpenAI API.
+        Generate `n` thoughts with a single call through the shared LLM client pool
+        (the model is asked for n distinct candidates).
+        A state already expanded in this request is served from the memo, and thoughts are
+        scored by the local scorer (local_score) when one is prepared.
         Returns a list of dictionaries containing 'thought' and 'evaluation'.
         """
-        client = AsyncOpenAI()
-
-        API_KEY = os.getenv("GROQ_API_KEY")
-
-        headers = {
-            "Authorization": f"Bearer {API_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        client = Groq(api_key=API_KEY)
-
-        def call_groq(task, system_prompt, n=1, temperature=0.1, max_tokens=20000):
-            response = client.chat.completions.create(
-                model="llama-3.3-70b-versatile",  # You may also use "mixtral-8x7b-32768"
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": task}
-                ],
-                temperature=temperature,
-                #max_tokens=max_tokens,
-                n=n
-            )
-
-            results = []
-            for choice in response.choices:
-                content = choice.message.content
-                try:
-                    parsed = string_to_dict(content.strip())
-                    if isinstance(parsed, dict) and "thought" in parsed and "evaluation" in parsed:
-                        results.append(parsed)
-                    else:
-                        results.append({"thought": content.strip(), "evaluation": 0.5})
-                except Exception:
-                    results.append({"thought": content.strip(), "evaluation": 0.5})
-            return results
-
-        results = call_groq(task,TREE_OF_THOUGHTS_SYS_PROMPT)
+        thoughts, _ = await self.run_counted(task, n)
+        return thoughts
+
+    async def run_counted(self, task: str, n: int = 1) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Same as run, and also returns the number of LLM calls it actually sent
+        (0 when the memo served the expansion).
+        """
+        if self.use_openai_caller:
+            provider, model = "openai", self.model
+            alternate = ("groq", GROQ_TOT_MODEL)
+        else:
+            provider, model = "groq", GROQ_TOT_MODEL  # You may also use "mixtral-8x7b-32768"
+            alternate = hedge_alternate
+
+        n = max(n, 1)
+        sent = []
+
+        async def expand():
+            sent.append(1)
+            return await self._expand(task, n, provider, model, alternate)
+
+        if self.memo is None:
+            thoughts = await expand()
+        else:
+            thoughts = await self.memo.get_or_run(task, n, model, TOT_SAMPLE_TEMPERATURE, expand)
+
+        if self.scorer is not None and self.scorer.ready:
+            await self._score(thoughts)
+        for thought in thoughts:
+            if thought["evaluation"] is None:
+                # The local score stands in for a missing self evaluation, the flat fallback only without a scorer
+                local_score = thought.get("local_score")
+                thought["evaluation"] = local_score if local_score is not None else TOT_FALLBACK_EVALUATION
+        return thoughts, sum(sent)
+
+    async def _score(self, thoughts: List[Dict[str, Any]]):
+        """Attach each thought's local score (embedding off the event loop)."""
+        loop = asyncio.get_running_loop()
+        scores = await loop.run_in_executor(None, self.scorer.score, [t["thought"] for t in thoughts])
+        for thought, local_score in zip(thoughts, scores):
+            thought["local_score"] = local_score
+
+    def expandable(self, thought: Dict[str, Any]) -> bool:
+        """Local pruning gate: False for a thought the local scorer rates off-topic or ungrounded."""
+        if self.scorer is None or thought.get("local_score") is None:
+            return True
+        return self.scorer.keeps(thought["local_score"])
+
+    @staticmethod
+    def _candidates_prompt(task: str, n: int) -> str:
+        if n == 1:
+            return task
+        return (
+            f"{task}\n\n"
+            f"Propose {n} distinct candidate thoughts for this step. Reply with a Python list of "
+            f"{n} dictionaries, each with a 'thought' and an 'evaluation' key as described above."
+        )
+
+    @staticmethod
+    def _parse_candidates(content: str, n: int) -> List[Dict[str, Any]]:
+        """Thoughts of one reply: a dict, or a list of up to n dicts; unparsable text is one thought without evaluation."""
+        content = content.strip()
+        try:
+            parsed = string_to_dict(content)
+        except Exception:
+            parsed = None
+        candidates = parsed if isinstance(parsed, list) else [parsed]
+        results = [
+            candidate for candidate in candidates
+            if isinstance(candidate, dict) and "thought" in candidate and "evaluation" in candidate
+        ][:n]
+        if not results:
+            # No usable self evaluation: scored locally, or TOT_FALLBACK_EVALUATION
+            results.append({"thought": content, "evaluation": None})
         return results
+
+    async def _expand(self, task: str, n: int, provider: str, model: str, alternate) -> List[Dict[str, Any]]:
+        # One call per expansion whatever n is: Groq serves a single choice per request,
+        # so the n candidates come from one prompt. A slow call is hedged to the alternate provider
+        response = await llm_clients.hedged_chat_completion(
+            provider,
+            model,
+            messages=[
+                {"role": "system", "content": TREE_OF_THOUGHTS_SYS_PROMPT},
+                {"role": "user", "content": self._candidates_prompt(task, n)}
+            ],
+            alternate=alternate,
+            hedge_key="tot",
+            temperature=TOT_SAMPLE_TEMPERATURE,
+        )
+        return self._parse_candidates(response.choices[0].message.content, n)
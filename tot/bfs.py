@@ -1,6 +1,6 @@
+import asyncio
 import json
 import uuid
-from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional
 
 from dotenv import load_dotenv
@@ -17,11 +17,11 @@ def string_to_dict(thought_string):
 
 class BFSWithTotAgent:
     """
-    A class to perform Breadth-First Search (BFS) using the TotAgent, based on the ToT-BFS algorithm.
+    A class to perform beam search (breadth-limited BFS) using the TotAgent, based on the ToT-BFS algorithm.
 
     Methods:
-        bfs(state: str) -> Dict[str, Any]: Performs BFS and returns the final thought.
-        run(tasks: str) -> str: Executes the BFS algorithm.
+        bfs(state: str) -> Dict[str, Any]: Performs the beam search and returns the final thought.
+        run(tasks: str) -> Dict[str, Any]: Executes the beam search and returns the highest rated thought.
     """
 
     def __init__(
@@ -32,6 +32,7 @@ class BFSWithTotAgent:
         number_of_agents: int = 1,
         autosave_on: bool = True,
         id: str = uuid.uuid4().hex,
+        threshold: Optional[float] = None,
     ):
         """
         Initialize the BFSWithTotAgent class.
@@ -39,10 +40,11 @@ class BFSWithTotAgent:
         Args:
             agent (TotAgent): An instance of the TotAgent class to generate and evaluate thoughts.
             max_loops (int): The maximum number of steps for the BFS algorithm.
-            breadth_limit (int): The maximum number of states to consider at each level.
+            breadth_limit (int): The maximum number of states to consider at each level (beam width).
             number_of_agents (int): The number of thoughts to generate at each step. Default is 3.
             autosave_on (bool): Whether to save the results automatically. Default is True.
             id (str): A unique identifier for the BFS instance. Default is a randomly generated UUID.
+            threshold (float): Stop early once a thought scores above this. Default is None (run every level).
         """
         self.id = id
         self.agent = agent
@@ -50,11 +52,13 @@ class BFSWithTotAgent:
         self.breadth_limit = breadth_limit
         self.number_of_agents = number_of_agents
         self.autosave_on = autosave_on
+        self.threshold = threshold
         self.all_thoughts = []  # Store all thoughts generated during BFS
 
-    def bfs(self, state: str) -> Optional[Dict[str, Any]]:
+    async def bfs(self, state: str) -> Optional[Dict[str, Any]]:
         """
-        Perform Breadth-First Search (BFS) with a breadth limit based on evaluation scores.
+        Perform beam search: every level expands all beam states concurrently and keeps the
+        `breadth_limit` best thoughts, ranked by the evaluations the agent already returned.
 
         Args:
             state (str): The initial state or tasks to explore.
@@ -64,12 +68,13 @@ class BFSWithTotAgent:
         """
         # Initialize the set of states
         S = [state]
+        beam: List[Dict[str, Any]] = []
 
         for t in range(1, self.max_loops + 1):
-            logger.info(f"Step {t}/{self.max_loops}: Expanding states.")
+            logger.info(f"Step {t}/{self.max_loops}: Expanding {len(S)} states.")
 
             # Generate new thoughts based on current states
-            S_prime = self._generate_new_states(S)
+            S_prime = await self._generate_new_states(S)
 
             if not S_prime:  # If no new states were generated, stop the BFS
                 logger.info(
@@ -84,43 +89,52 @@ class BFSWithTotAgent:
             self._log_and_store_thoughts(S_prime, V)
 
             # Select the best states based on their evaluations, limited by breadth_limit
-            S = self._select_best_states(S_prime, V)
+            beam = self._select_best_states(S_prime, V)
+
+            if self.threshold is not None and beam[0]["evaluation"] > self.threshold:
+                logger.info(f"Thought above threshold at step {t}. Stopping BFS.")
+                break
+
+            # Thoughts the local scorer rates off-topic stay candidates but are not expanded
+            S = [thought["thought"] for thought in beam if self.agent.expandable(thought)]
+            if not S:
+                logger.info(f"No beam state passed the local gate at step {t}. Stopping BFS.")
+                break
 
         # Return the best final thought
-        return self._generate_final_answer(S)
+        return self._generate_final_answer(beam)
 
-    def _generate_new_states(self, S: List[str]) -> List[Dict[str, Any]]:
-        """Generate new states (thoughts) from the current states."""
+    async def _generate_new_states(self, S: List[str]) -> List[List[Any]]:
+        """Generate new states (thoughts) from all current states concurrently."""
+        results = await asyncio.gather(
+            *(self._run_agent(s) for s in S)
+        )
         S_prime = []
-        for s in S:
-            with ThreadPoolExecutor() as executor:
-                new_thoughts = list(
-                    executor.map(self.agent.run, [s] * self.number_of_agents)
-                )
-                S_prime.extend(
-                    [
-                        [s, thought]
-                        for thought in new_thoughts
-                        if thought is not None
-                    ]
-                )
+        for s, new_thoughts in zip(S, results):
+            S_prime.extend(
+                [
+                    [s, thought]
+                    for thought in new_thoughts
+                    if thought is not None
+                ]
+            )
         return S_prime
 
-    def _evaluate_states(self, S_prime: List[Dict[str, Any]]) -> List[float]:
+    def _evaluate_states(self, S_prime: List[List[Any]]) -> List[float]:
         """Evaluate the new states."""
         return [thought["evaluation"] for _, thought in S_prime]
 
     def _log_and_store_thoughts(
-        self, S_prime: List[Dict[str, Any]], V: List[float]
+        self, S_prime: List[List[Any]], V: List[float]
     ):
         """Log and store all generated thoughts."""
         for i, (_, thought) in enumerate(S_prime):
             self.all_thoughts.append(thought)
 
     def _select_best_states(
-        self, S_prime: List[Dict[str, Any]], V: List[float]
-    ) -> List[str]:
-        """Select the best states based on their evaluations, limited by breadth_limit."""
+        self, S_prime: List[List[Any]], V: List[float]
+    ) -> List[Dict[str, Any]]:
+        """Select the best thoughts based on their evaluations, limited by breadth_limit."""
         # Pair states with their evaluations
         state_evaluation_pairs = list(zip(S_prime, V))
 
@@ -129,37 +143,36 @@ class BFSWithTotAgent:
 
         # Select the top states based on the breadth limit
         best_states = [
-            pair[0][1]["thought"]
+            pair[0][1]
             for pair in state_evaluation_pairs[: self.breadth_limit]
         ]
         return best_states
 
-    def _generate_final_answer(self, S: List[str]) -> Optional[Dict[str, Any]]:
-        """Generate the final answer by selecting the best thought from the last set of states."""
-        if not S:
+    def _generate_final_answer(self, beam: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Pick the best thought of the last beam from the evaluations already returned (no extra calls)."""
+        if not beam:
             return None
-        final_state = max(S, key=lambda s: self.agent.run(s)["evaluation"])
-        return self.agent.run(final_state)
+        return max(beam, key=lambda thought: thought["evaluation"])
 
-    def _run_agent(self, task: str) -> Optional[Dict[str, Any]]:
-        """Run the agent to generate a thought and its evaluation."""
+    async def _run_agent(self, task: str) -> List[Dict[str, Any]]:
+        """Run the agent to generate thoughts and their evaluations."""
         try:
-            return self.agent.run(task)
+            return await self.agent.run(task, n=self.number_of_agents)
         except Exception as e:
             logger.error(f"Error in agent run: {e}")
-        return None
+        return []
 
-    def run(self, task: str) -> str:
+    async def run(self, task: str) -> Optional[Dict[str, Any]]:
         """
-        Execute the BFS algorithm.
+        Execute the beam search.
 
         Args:
             task (str): The initial tasks or state to start the BFS.
 
         Returns:
-            str: The final thought after BFS as a JSON string.
+            Optional[Dict[str, Any]]: The highest rated final thought, like ToTDFSAgent.run.
         """
-        final_thought = self.bfs(task)
+        final_thought = await self.bfs(task)
 
         # Sort all thoughts by evaluation score in ascending order
         self.all_thoughts.sort(key=lambda x: x["evaluation"], reverse=False)
@@ -174,4 +187,5 @@ class BFSWithTotAgent:
         # if self.autosave_on:
         #     _save_dict_to_json(tree_dict, self.id)
 
-        return json.dumps(tree_dict, indent=4)
+        logger.debug(json.dumps(tree_dict, indent=4))
+        return final_thought
@@ -1,3 +1,4 @@
+import os
 import uuid
 import json
 from typing import Optional
@@ -8,10 +9,14 @@ from loguru import logger
 from dotenv import load_dotenv
 import asyncio
 
+from tot.adaptive import TOT_ADAPTIVE, AdaptiveSearchController
 from tot.agent import TotAgent
 
 load_dotenv()
 
+# Max branches expanded (agent calls in flight) at once in parallel mode
+TOT_MAX_PARALLEL_BRANCHES = int(os.getenv("TOT_MAX_PARALLEL_BRANCHES", "4"))
+
 
 class ToTDFSAgent:
     """
@@ -19,6 +24,7 @@ class ToTDFSAgent:
 
     Methods:
         dfs(state: str, step: int = 0) -> Optional[Thought]: Performs DFS with pruning and returns the final thought.
+        dfs_parallel(state: str) -> Optional[Thought]: Expands sibling branches concurrently and stops at the first thought above threshold.
         visualize_thoughts(thoughts: List[Thought]): Visualizes all thoughts including the highest-rated thought.
     """
 
@@ -31,6 +37,9 @@ class ToTDFSAgent:
         number_of_agents: int = 1,
         autosave_on: bool = True,
         id: str = uuid.uuid4().hex,
+        parallel: bool = False,
+        max_parallel_branches: int = TOT_MAX_PARALLEL_BRANCHES,
+        adaptive: bool = TOT_ADAPTIVE,
         *args,
         **kwargs,
     ):
@@ -42,6 +51,9 @@ class ToTDFSAgent:
             threshold (float): The evaluation threshold for selecting promising thoughts.
             max_loops (int): The maximum depth for the DFS algorithm.
             prune_threshold (float): The threshold below which branches are pruned. Default is 0.5.
+            parallel (bool): Expand sibling branches concurrently instead of one at a time.
+            max_parallel_branches (int): Max branches expanded at once in parallel mode.
+            adaptive (bool): Let an AdaptiveSearchController stop early and shrink number_of_agents.
         """
         self.id = id
         self.agent = agent
@@ -52,24 +64,59 @@ class ToTDFSAgent:
         self.pruned_branches = []  # Store metadata on pruned branches
         self.number_of_agents = number_of_agents
         self.autosave_on = autosave_on
+        self.parallel = parallel
+        self.max_parallel_branches = max_parallel_branches
+        self._solution = None
+        self.controller = (
+            AdaptiveSearchController(threshold, number_of_agents, max_loops) if adaptive else None
+        )
 
         self.agent.max_loops = max_loops
 
-    async def dfs(self, state: str, step: int = 0) -> Optional[Dict[str, Any]]:
+    async def _sample(self, state: str, step: int, parent_evaluation: Optional[float] = None):
+        """
+        Ask the agent for thoughts on `state`, sized by the adaptive controller.
+
+        Returns: (thoughts, whether they are worth expanding further)
+        """
+        controller = self.controller
+        if controller is None:
+            return await self.agent.run(state, n=self.number_of_agents), True
+
+        # Only calls the memo actually sent count against the budget
+        if controller.probe_first():
+            thoughts, calls = await self.agent.run_counted(state, n=1)
+            if not controller.probe(thoughts):
+                more, more_calls = await self.agent.run_counted(state, n=self.number_of_agents - 1)
+                thoughts, calls = thoughts + more, calls + more_calls
+        else:
+            thoughts, calls = await self.agent.run_counted(state, n=controller.n)
+
+        return thoughts, controller.record(step, thoughts, calls, parent_evaluation)
+
+    def budget_used(self) -> Optional[Dict[str, Any]]:
+        """LLM budget actually spent by the last run (None when not adaptive)."""
+        return self.controller.report() if self.controller else None
+
+    async def dfs(self, state: str, step: int = 0, parent_evaluation: Optional[float] = None) -> Optional[Dict[str, Any]]:
         if step >= self.max_loops:
             return None
 
         print(f"🧠 DFS Step {step} — Requesting {self.number_of_agents} thoughts...")
 
         # 🔥 Make one batched call instead of N loops
-        all_thoughts = await self.agent.run(state, n=self.number_of_agents)
+        all_thoughts, descend = await self._sample(state, step, parent_evaluation)
 
         all_thoughts.sort(key=lambda x: x["evaluation"])
 
         for thought in all_thoughts:
             if thought["evaluation"] > self.prune_threshold:
                 self.all_thoughts.append(thought)
-                result = await self.dfs(thought["thought"], step + 1)
+                if not descend or (self.controller and self.controller.stopped):
+                    continue
+                if not self.agent.expandable(thought):
+                    continue
+                result = await self.dfs(thought["thought"], step + 1, thought["evaluation"])
                 if result and result["evaluation"] > self.threshold:
                     return result
             else:
@@ -77,6 +124,68 @@ class ToTDFSAgent:
 
         return self.all_thoughts[-1] if self.all_thoughts else {"thought": "No valid thoughts found."}
 
+    async def _expand(
+        self,
+        state: str,
+        step: int,
+        semaphore: asyncio.Semaphore,
+        solved: asyncio.Event,
+        parent_evaluation: Optional[float] = None,
+    ):
+        if step >= self.max_loops or solved.is_set():
+            return
+
+        async with semaphore:
+            print(f"🧠 Parallel DFS Step {step} — Requesting {self.number_of_agents} thoughts...")
+            all_thoughts, descend = await self._sample(state, step, parent_evaluation)
+
+        children = []
+        for thought in sorted(all_thoughts, key=lambda x: x["evaluation"], reverse=True):
+            if thought["evaluation"] > self.prune_threshold:
+                self.all_thoughts.append(thought)
+                if thought["evaluation"] > self.threshold and not solved.is_set():
+                    self._solution = thought
+                    solved.set()
+                    return
+                if self.agent.expandable(thought):
+                    children.append(thought)
+            else:
+                self._prune_thought(thought)
+
+        if not descend or (self.controller and self.controller.stopped):
+            return
+
+        # Siblings above prune_threshold are explored side by side
+        await asyncio.gather(
+            *(self._expand(child["thought"], step + 1, semaphore, solved, child["evaluation"]) for child in children)
+        )
+
+    async def dfs_parallel(self, state: str) -> Optional[Dict[str, Any]]:
+        """
+        Concurrent DFS: all promising siblings expand at once (bounded by max_parallel_branches),
+        and every outstanding branch is cancelled as soon as one thought exceeds threshold.
+        Wall time follows the depth of the tree rather than the number of nodes.
+        """
+        self._solution = None
+        semaphore = asyncio.Semaphore(self.max_parallel_branches)
+        solved = asyncio.Event()
+
+        search = asyncio.create_task(self._expand(state, 0, semaphore, solved))
+        solved_wait = asyncio.create_task(solved.wait())
+        try:
+            await asyncio.wait({search, solved_wait}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (search, solved_wait):
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(search, solved_wait, return_exceptions=True)
+
+        if self._solution is not None:
+            return self._solution
+        if self.all_thoughts:
+            return max(self.all_thoughts, key=lambda x: x["evaluation"])
+        return {"thought": "No valid thoughts found."}
+
     def _prune_thought(self, thought: Dict[str, Any]):
         self.pruned_branches.append(
             {
@@ -88,16 +197,20 @@ class ToTDFSAgent:
 
     async def run(self, task: str, *args, **kwargs) -> str:
 
-        # Initialize the first agent run
-        initial_thoughts = await self.dfs(task, *args, **kwargs)
-
-        # Chain the agents' outputs through subsequent agents
-        for i in range(1, self.max_loops):
-            if initial_thoughts:
-                next_task = initial_thoughts["thought"]
-                initial_thoughts = await self.dfs(next_task, step=i)
-            else:
-                break
+        if self.parallel:
+            # One concurrent search over the whole tree, no re-chaining
+            await self.dfs_parallel(task)
+        else:
+            # Initialize the first agent run
+            initial_thoughts = await self.dfs(task, *args, **kwargs)
+
+            # Chain the agents' outputs through subsequent agents
+            for i in range(1, self.max_loops):
+                if initial_thoughts and not (self.controller and self.controller.converged):
+                    next_task = initial_thoughts["thought"]
+                    initial_thoughts = await self.dfs(next_task, step=i, parent_evaluation=initial_thoughts.get("evaluation"))
+                else:
+                    break
 
         # After chaining, sort all final thoughts
         self.all_thoughts.sort(key=lambda x: x["evaluation"], reverse=False)
@@ -110,6 +223,10 @@ class ToTDFSAgent:
             ),
         }
 
+        if self.controller:
+            tree_dict["budget_used"] = self.controller.report()
+            print(f"💰 ToT budget used: {tree_dict['budget_used']}")
+
         json_string = json.dumps(tree_dict, indent=4)
 
         if self.autosave_on:
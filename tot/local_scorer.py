@@ -0,0 +1,127 @@
+import os
+import re
+from typing import List, Optional
+
+import numpy as np
+
+# Thoughts scoring below this locally are kept as candidates but not expanded further.
+# Relevant thoughts score around 0.5-0.6 with MiniLM, off-topic ones below 0.1.
+TOT_LOCAL_PRUNE_SCORE = float(os.getenv("TOT_LOCAL_PRUNE_SCORE", "0.2"))
+
+# Cosine similarities are rescaled from [floor, ceiling] to [0, 1]; MiniLM rarely leaves this band
+TOT_LOCAL_SIMILARITY_FLOOR = float(os.getenv("TOT_LOCAL_SIMILARITY_FLOOR", "0.1"))
+TOT_LOCAL_SIMILARITY_CEILING = float(os.getenv("TOT_LOCAL_SIMILARITY_CEILING", "0.8"))
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "what", "which", "when", "where", "who",
+    "how", "are", "was", "were", "will", "shall", "can", "may", "under", "does", "have", "has",
+    "into", "there", "their", "about", "any", "not", "such", "other", "also", "been",
+}
+
+
+def content_words(text: str) -> set:
+    return {word for word in _WORD.findall(text.lower()) if len(word) > 2 and word not in _STOPWORDS}
+
+
+class LocalThoughtScorer:
+    """
+    Scores ToT thoughts on-box with the shared MiniLM embedding model, no LLM calls.
+
+    The score mixes similarity to the query, similarity to the best matching retrieved
+    chunk, coverage of the query's terms and grounding of the thought's terms in the chunks.
+    It never replaces the LLM evaluation the thresholds are tuned for: it only gates which
+    thoughts are worth another expansion.
+    """
+
+    def __init__(self, embed_model, prune_score: float = TOT_LOCAL_PRUNE_SCORE):
+        """
+        Args:
+            embed_model: shared embedding model (the same one used for retrieval)
+            prune_score: local score below which a thought is not expanded
+        """
+        self.embed_model = embed_model
+        self.prune_score = prune_score
+
+        self._query_vector: Optional[np.ndarray] = None
+        self._chunk_vectors: Optional[np.ndarray] = None
+        self._query_words: set = set()
+        self._chunk_words: set = set()
+        self.scored = 0
+        self.gated = 0
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    @staticmethod
+    def _rescale(similarity: np.ndarray) -> np.ndarray:
+        span = TOT_LOCAL_SIMILARITY_CEILING - TOT_LOCAL_SIMILARITY_FLOOR
+        return np.clip((similarity - TOT_LOCAL_SIMILARITY_FLOOR) / span, 0.0, 1.0)
+
+    def prepare(self, query: str, chunks: List[str], chunk_vectors: Optional[List[Optional[np.ndarray]]] = None):
+        """
+        Embed the query and the retrieved chunks once per request.
+        Args:
+            query: user query
+            chunks: retrieved chunk texts
+            chunk_vectors: vectors the index already stores for the chunks (None where missing),
+                only the missing ones are embedded
+        """
+        self._query_vector = self._normalize(np.asarray(self.embed_model.get_query_embedding(query), dtype=np.float32))
+        self._chunk_vectors = None
+        if chunks:
+            vectors = list(chunk_vectors) if chunk_vectors is not None else [None] * len(chunks)
+            missing = [i for i, vector in enumerate(vectors) if vector is None]
+            if missing:
+                embedded = self.embed_model.get_text_embedding_batch([chunks[i] for i in missing])
+                for i, vector in zip(missing, embedded):
+                    vectors[i] = vector
+            self._chunk_vectors = self._normalize(np.asarray(vectors, dtype=np.float32))
+        self._query_words = content_words(query)
+        self._chunk_words = set().union(*(content_words(chunk) for chunk in chunks)) if chunks else set()
+
+    @property
+    def ready(self) -> bool:
+        return self._query_vector is not None
+
+    def score(self, thoughts: List[str]) -> List[float]:
+        """
+        Args:
+            thoughts: candidate thought texts
+
+        Returns: local scores in [0, 1], one per thought
+        """
+        if not thoughts:
+            return []
+        vectors = self._normalize(np.asarray(self.embed_model.get_text_embedding_batch(thoughts), dtype=np.float32))
+
+        query_similarity = self._rescale(vectors @ self._query_vector)
+        if self._chunk_vectors is not None:
+            chunk_similarity = self._rescale((vectors @ self._chunk_vectors.T).max(axis=1))
+        else:
+            chunk_similarity = query_similarity
+
+        scores = []
+        for i, thought in enumerate(thoughts):
+            words = content_words(thought)
+            coverage = len(words & self._query_words) / len(self._query_words) if self._query_words else 0.0
+            grounding = len(words & self._chunk_words) / len(words) if words and self._chunk_words else 0.0
+            score = (
+                0.3 * query_similarity[i]
+                + 0.3 * chunk_similarity[i]
+                + 0.2 * coverage
+                + 0.2 * grounding
+            )
+            scores.append(round(float(score), 4))
+
+        self.scored += len(thoughts)
+        return scores
+
+    def keeps(self, local_score: float) -> bool:
+        """Whether a thought with this local score is worth expanding."""
+        if local_score >= self.prune_score:
+            return True
+        self.gated += 1
+        return False
@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.cache.redis_cache import RedisCacheTier
+from utils.cache.ttl_lru_cache import TTLLRUCache
+
+# Cross-request tier: only calls at or below this temperature are close enough to deterministic to share
+TOT_MEMO_SHARED_ENABLED = os.getenv("TOT_MEMO_SHARED_ENABLED", "false").lower() == "true"
+TOT_MEMO_SHARED_MAX_TEMPERATURE = float(os.getenv("TOT_MEMO_SHARED_MAX_TEMPERATURE", "0.2"))
+TOT_MEMO_SHARED_SIZE = int(os.getenv("TOT_MEMO_SHARED_SIZE", "1024"))
+TOT_MEMO_SHARED_TTL = int(os.getenv("TOT_MEMO_SHARED_TTL", "3600"))
+
+_shared_local = TTLLRUCache(max_size=TOT_MEMO_SHARED_SIZE, ttl_seconds=TOT_MEMO_SHARED_TTL)
+_shared_redis = RedisCacheTier.from_env("TOT_MEMO_REDIS_URL", prefix="tot", ttl_seconds=TOT_MEMO_SHARED_TTL)
+
+
+def state_hash(state: str) -> str:
+    return hashlib.sha1(state.encode("utf-8")).hexdigest()
+
+
+class ThoughtMemo:
+    """
+    Memo of TotAgent expansions for the life of one request.
+
+    Keyed by (state hash, n, model, temperature). A state that is already being
+    expanded is awaited instead of sent again, so duplicate expansions cost no calls.
+    Low-temperature results can also be shared across requests (TOT_MEMO_SHARED_ENABLED).
+    """
+
+    def __init__(self, shared: bool = TOT_MEMO_SHARED_ENABLED, shared_max_temperature: float = TOT_MEMO_SHARED_MAX_TEMPERATURE):
+        """
+        Args:
+            shared: also look up / store results in the cross-request tier
+            shared_max_temperature: highest temperature whose results are shared
+        """
+        self.shared = shared
+        self.shared_max_temperature = shared_max_temperature
+        self._entries: Dict[str, asyncio.Future] = {}
+
+        self.calls_made = 0
+        self.calls_saved = 0
+        self.shared_hits = 0
+
+    @staticmethod
+    def key(state: str, n: int, model: str, temperature: float) -> str:
+        return f"{state_hash(state)}:{n}:{model}:{temperature}"
+
+    def _shared_get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        value = _shared_local.get(key)
+        if value is None and _shared_redis is not None:
+            raw = _shared_redis.get(key)
+            if raw is not None:
+                value = json.loads(raw)
+                _shared_local.set(key, value)
+        return value
+
+    def _shared_set(self, key: str, thoughts: List[Dict[str, Any]]):
+        _shared_local.set(key, thoughts)
+        if _shared_redis is not None:
+            _shared_redis.set(key, json.dumps(thoughts).encode("utf-8"))
+
+    async def get_or_run(
+        self,
+        state: str,
+        n: int,
+        model: str,
+        temperature: float,
+        expand: Callable[[], Awaitable[List[Dict[str, Any]]]],
+    ) -> List[Dict[str, Any]]:
+        """
+        Args:
+            state: prompt being expanded
+            n: number of thoughts requested
+            model: model the thoughts are sampled from
+            temperature: sampling temperature
+            expand: coroutine function that makes the expansion's LLM call
+
+        Returns: copies of the memoized thoughts, so callers may mutate them
+        """
+        key = self.key(state, n, model, temperature)
+        shareable = self.shared and temperature <= self.shared_max_temperature
+
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = asyncio.get_running_loop().create_future()
+            self._entries[key] = entry
+            try:
+                thoughts = self._shared_get(key) if shareable else None
+                if thoughts is not None:
+                    self.shared_hits += 1
+                    self.calls_saved += 1
+                else:
+                    thoughts = await expand()
+                    self.calls_made += 1
+                    if shareable:
+                        self._shared_set(key, thoughts)
+                entry.set_result(thoughts)
+            except asyncio.CancelledError:
+                del self._entries[key]
+                entry.cancel()
+                raise
+            except Exception as e:
+                # Failed expansions are not memoized: waiters see the error, the next caller retries
+                del self._entries[key]
+                entry.set_exception(e)
+                entry.exception()  # mark retrieved when nobody else is waiting
+                raise
+        else:
+            try:
+                thoughts = await asyncio.shield(entry)
+            except asyncio.CancelledError:
+                if not entry.cancelled():
+                    raise
+                # The leading call was cancelled, expand it ourselves
+                return await self.get_or_run(state, n, model, temperature, expand)
+            self.calls_saved += 1
+
+        return [dict(thought) for thought in thoughts]
+
+    def stats(self) -> dict:
+        return {
+            "calls_made": self.calls_made,
+            "calls_saved": self.calls_saved,
+            "shared_hits": self.shared_hits,
+            "states": len(self._entries),
+        }
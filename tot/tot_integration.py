@@ -1,10 +1,23 @@
 import asyncio
+import os
 import time
 import html
-from typing import List
+from typing import List, Optional
+
+import numpy as np
 
 from tot.agent import TotAgent
+from tot.bfs import BFSWithTotAgent
 from tot.dfs import ToTDFSAgent
+from tot.local_scorer import LocalThoughtScorer
+from tot.thought_memo import ThoughtMemo
+
+# Expand sibling thoughts concurrently (see ToTDFSAgent.dfs_parallel)
+TOT_PARALLEL_DFS = os.getenv("TOT_PARALLEL_DFS", "true").lower() == "true"
+
+# "dfs" (depth first with pruning) or "beam" (async beam search, lower latency)
+TOT_SEARCH = os.getenv("TOT_SEARCH", "dfs")
+TOT_BEAM_WIDTH = int(os.getenv("TOT_BEAM_WIDTH", "2"))
 
 
 class TotRagIntegration:
@@ -20,22 +33,46 @@ class TotRagIntegration:
         prune_threshold: float = 0.5,
         number_of_agents: int = 1,
         use_openai_caller: bool = False,
+        parallel_dfs: bool = TOT_PARALLEL_DFS,
+        search: str = TOT_SEARCH,
+        beam_width: int = TOT_BEAM_WIDTH,
+        embed_model=None,
     ):
         """
         Initialize the TotRagIntegration class.
+        search: "dfs" or "beam"; beam_width is the number of states kept per level in beam mode.
+        embed_model: shared embedding model; when given, thoughts are pre-scored locally (LocalThoughtScorer).
         """
         print("[INIT] Initializing ToT-RAG Integration...")
 
-        self.tot_agent = TotAgent(use_openai_caller=use_openai_caller)
-        self.dfs_agent = ToTDFSAgent(
-            agent=self.tot_agent,
-            threshold=threshold,
-            max_loops=max_loops,
-            prune_threshold=prune_threshold,
-            number_of_agents=number_of_agents,
-        )
-
-        print(f"[INIT] ToTDFSAgent configured with threshold={threshold}, max_loops={max_loops}, prune_threshold={prune_threshold}, number_of_agents={number_of_agents}")
+        if search not in ("dfs", "beam"):
+            raise ValueError(f"Unknown ToT search '{search}', expected 'dfs' or 'beam'.")
+        self.search = search
+
+        # One integration serves one request, so the memo lives exactly as long as the request
+        self.memo = ThoughtMemo()
+        self.scorer = LocalThoughtScorer(embed_model) if embed_model is not None else None
+        self.tot_agent = TotAgent(use_openai_caller=use_openai_caller, memo=self.memo, scorer=self.scorer)
+        if search == "beam":
+            self.search_agent = BFSWithTotAgent(
+                agent=self.tot_agent,
+                max_loops=max_loops,
+                breadth_limit=beam_width,
+                number_of_agents=number_of_agents,
+                threshold=threshold,
+            )
+            print(f"[INIT] BFSWithTotAgent configured with threshold={threshold}, max_loops={max_loops}, beam_width={beam_width}, number_of_agents={number_of_agents}")
+        else:
+            self.dfs_agent = ToTDFSAgent(
+                agent=self.tot_agent,
+                threshold=threshold,
+                max_loops=max_loops,
+                prune_threshold=prune_threshold,
+                number_of_agents=number_of_agents,
+                parallel=parallel_dfs,
+            )
+            self.search_agent = self.dfs_agent
+            print(f"[INIT] ToTDFSAgent configured with threshold={threshold}, max_loops={max_loops}, prune_threshold={prune_threshold}, number_of_agents={number_of_agents}, parallel={parallel_dfs}")
 
     def format_context_for_tot(self, user_query: str, retrieved_chunks: List[str]) -> str:
         """
@@ -61,9 +98,16 @@ Instructions:
 """
         return prompt.strip()
 
-    async def enhance_response(self, user_query: str, retrieved_chunks: List[str]) -> str:
+    async def enhance_response(
+        self,
+        user_query: str,
+        retrieved_chunks: List[str],
+        chunk_vectors: Optional[List[Optional[np.ndarray]]] = None,
+    ) -> str:
         """
         Enhances RAG-retrieved chunks using Tree of Thoughts (ToT) reasoning.
+        chunk_vectors are the index's stored vectors of the chunks (None where missing),
+        reused by the local scorer instead of embedding the chunks again.
         """
         try:
             print("\n[ToT-RAG] Starting enhancement process...")
@@ -79,10 +123,17 @@ Instructions:
             print("Length of initial prompt: ", len(initial_prompt))
             print("$" * 50)
 
-            # Step 2: Run ToT DFS Agent
+            # Embed the query and chunks once so every thought can be scored locally
+            if self.scorer is not None:
+                t_scorer_start = time.time()
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self.scorer.prepare, user_query, retrieved_chunks, chunk_vectors)
+                print(f"[ToT-RAG] Local scorer ready in {time.time() - t_scorer_start:.2f} seconds")
+
+            # Step 2: Run ToT search agent
             t_tot_start = time.time()
-            print("\n[ToT-RAG] Running ToT DFS Agent...")
-            final_thought = await self.dfs_agent.run(initial_prompt)
+            print(f"\n[ToT-RAG] Running ToT {self.search} search...")
+            final_thought = await self.search_agent.run(initial_prompt)
             t_tot_end = time.time()
 
             # Step 3: Process Output
@@ -101,7 +152,10 @@ Instructions:
 
             t_end = time.time()
             # print(f"\n✅ ToT-RAG enhancement completed in {t_end - t_start:.2f} seconds")
-            print(f"   - ToT DFS Agent execution time: {t_tot_end - t_tot_start:.2f} seconds")
+            print(f"   - ToT {self.search} search execution time: {t_tot_end - t_tot_start:.2f} seconds")
+            print(f"   - ToT memo: {self.memo.stats()}")
+            if self.scorer is not None:
+                print(f"   - Thoughts scored locally: {self.scorer.scored} ({self.scorer.gated} not expanded)")
             print(f"\n[FINAL ANSWER]\n{final_answer}\n")
 
             return final_answer
@@ -110,6 +164,12 @@ Instructions:
             print(f"[ERROR] ToT-RAG enhancement failed: {e}")
             return f"An error occurred during response enhancement: {e}"
 
+    def budget_used(self):
+        """LLM budget spent by the adaptive DFS controller, None in beam mode or when not adaptive."""
+        if self.search == "dfs":
+            return self.dfs_agent.budget_used()
+        return None
+
     def extract_final_answer(self, text: str) -> str:
         """
         Extracts the final answer by cutting off before the '### Final Evaluation' marker.
@@ -0,0 +1,65 @@
+import os
+from typing import Optional
+
+import redis
+
+
+class RedisCacheTier:
+    """
+    Shared cache tier on Redis used behind the in-process caches.
+
+    Every operation is best effort: a slow or unavailable Redis is treated as a miss
+    so the request falls back to computing the value locally.
+    """
+
+    def __init__(self, url: str, prefix: str, ttl_seconds: Optional[int] = None, timeout: float = 0.05):
+        """
+        Args:
+            url: redis connection url
+            prefix: key namespace, e.g. "emb"
+            ttl_seconds: expiry of written keys, None for no expiry
+            timeout: socket timeout in seconds
+        """
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        self._client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls, env_var: str, prefix: str, ttl_seconds: Optional[int] = None) -> Optional["RedisCacheTier"]:
+        """
+        Build a tier from the url in `env_var`, or return None when it is not set.
+        """
+        url = os.getenv(env_var)
+        if not url:
+            return None
+        return cls(url, prefix, ttl_seconds)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            value = self._client.get(self._key(key))
+        except redis.RedisError as e:
+            self.errors += 1
+            print(f"⚠️ Redis cache get failed ({self.prefix}): {e}")
+            return None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes):
+        try:
+            self._client.set(self._key(key), value, ex=self.ttl_seconds)
+        except redis.RedisError as e:
+            self.errors += 1
+            print(f"⚠️ Redis cache set failed ({self.prefix}): {e}")
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors}
@@ -0,0 +1,188 @@
+import json
+import os
+import re
+from collections import Counter
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# Files written next to the other stores of a category
+BM25_ARRAYS_FILE = "bm25.npz"
+BM25_VOCAB_FILE = "bm25_vocab.json"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Kept short on purpose: words like "section", "act" or "of" in "code of criminal
+# procedure" carry meaning for statute lookups
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "or", "that", "the", "this", "to", "was", "what", "which", "with",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def has_bm25_index(persist_dir: str) -> bool:
+    """Check whether a persisted category index has a lexical index."""
+    return os.path.exists(os.path.join(persist_dir, BM25_ARRAYS_FILE))
+
+
+class BM25Index:
+    """
+    Compact inverted index with Okapi BM25 scoring.
+
+    Postings are stored CSR style: for term t, postings[indptr[t]:indptr[t + 1]] are the
+    documents containing it and term_freqs holds the matching frequencies. A query
+    touches only the postings of its own terms.
+    """
+
+    def __init__(
+        self,
+        vocab: dict,
+        doc_ids: List[str],
+        indptr: np.ndarray,
+        postings: np.ndarray,
+        term_freqs: np.ndarray,
+        doc_lens: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.vocab = vocab
+        self.doc_ids = doc_ids
+        self.indptr = indptr
+        self.postings = postings
+        self.term_freqs = term_freqs
+        self.doc_lens = doc_lens
+        self.k1 = k1
+        self.b = b
+
+        n_docs = len(doc_ids)
+        self.avg_doc_len = max(float(doc_lens.mean()), 1.0) if n_docs else 1.0
+        doc_freqs = np.diff(indptr).astype(np.float32)
+        self.idf = np.log(1.0 + (n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        # Per-document part of the BM25 denominator, precomputed once
+        if n_docs:
+            self._len_norm = (k1 * (1.0 - b + b * doc_lens / self.avg_doc_len)).astype(np.float32)
+        else:
+            self._len_norm = np.zeros(0, dtype=np.float32)
+
+    @classmethod
+    def build(cls, doc_ids: Sequence[str], texts: Sequence[str]) -> "BM25Index":
+        """
+        Build the index from chunk texts.
+        Args:
+            doc_ids: node id of every chunk
+            texts: chunk texts, aligned with doc_ids
+
+        Returns: BM25Index
+
+        """
+        vocab = {}
+        term_postings: List[List[Tuple[int, int]]] = []
+        doc_lens = np.zeros(len(doc_ids), dtype=np.float32)
+
+        for doc_index, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lens[doc_index] = len(tokens)
+            for token, tf in Counter(tokens).items():
+                term_id = vocab.get(token)
+                if term_id is None:
+                    term_id = vocab[token] = len(term_postings)
+                    term_postings.append([])
+                term_postings[term_id].append((doc_index, tf))
+
+        indptr = np.zeros(len(term_postings) + 1, dtype=np.int64)
+        for term_id, entries in enumerate(term_postings):
+            indptr[term_id + 1] = indptr[term_id] + len(entries)
+
+        postings = np.empty(int(indptr[-1]), dtype=np.int32)
+        term_freqs = np.empty(int(indptr[-1]), dtype=np.float32)
+        for term_id, entries in enumerate(term_postings):
+            start = indptr[term_id]
+            for offset, (doc_index, tf) in enumerate(entries):
+                postings[start + offset] = doc_index
+                term_freqs[start + offset] = tf
+
+        return cls(vocab, list(doc_ids), indptr, postings, term_freqs, doc_lens)
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str) -> "BM25Index":
+        with open(os.path.join(persist_dir, BM25_VOCAB_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        vocab = {token: term_id for term_id, token in enumerate(meta["terms"])}
+        with np.load(os.path.join(persist_dir, BM25_ARRAYS_FILE)) as arrays:
+            return cls(
+                vocab,
+                meta["doc_ids"],
+                arrays["indptr"],
+                arrays["postings"],
+                arrays["term_freqs"],
+                arrays["doc_lens"],
+            )
+
+    def persist(self, persist_dir: str):
+        os.makedirs(persist_dir, exist_ok=True)
+
+        arrays_path = os.path.join(persist_dir, BM25_ARRAYS_FILE)
+        tmp_arrays_path = arrays_path + ".tmp"
+        with open(tmp_arrays_path, "wb") as f:
+            np.savez(
+                f,
+                indptr=self.indptr,
+                postings=self.postings,
+                term_freqs=self.term_freqs,
+                doc_lens=self.doc_lens,
+            )
+        os.replace(tmp_arrays_path, arrays_path)
+
+        terms = [None] * len(self.vocab)
+        for token, term_id in self.vocab.items():
+            terms[term_id] = token
+        vocab_path = os.path.join(persist_dir, BM25_VOCAB_FILE)
+        tmp_vocab_path = vocab_path + ".tmp"
+        with open(tmp_vocab_path, "w", encoding="utf-8") as f:
+            json.dump({"terms": terms, "doc_ids": self.doc_ids}, f)
+        os.replace(tmp_vocab_path, vocab_path)
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Score every document containing a query term and return the best ones.
+        Returns: list of (doc_id, bm25 score), best first
+        """
+        term_ids = {self.vocab[token] for token in tokenize(query) if token in self.vocab}
+        if not term_ids or not self.doc_ids:
+            return []
+
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            docs = self.postings[start:end]
+            tf = self.term_freqs[start:end]
+            # A term's postings list each document once, so fancy-index += is safe
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1.0) / (tf + self._len_norm[docs])
+
+        matched = int(np.count_nonzero(scores))
+        top_k = min(top_k, matched)
+        if top_k <= 0:
+            return []
+        top_docs = np.argpartition(-scores, top_k - 1)[:top_k]
+        top_docs = top_docs[np.argsort(-scores[top_docs])]
+        return [(self.doc_ids[doc], float(scores[doc])) for doc in top_docs]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.indptr.nbytes + self.postings.nbytes + self.term_freqs.nbytes + self.doc_lens.nbytes)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse several ranked id lists: score(id) = sum over lists of 1 / (k + rank).
+    Returns: list of (id, fused score), best first
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+
+
+class EmbeddingMicroBatcher:
+    """
+    Collects query embeddings requested by concurrent callers and runs them as one batch.
+
+    A single background thread takes the first waiting query, keeps collecting for up
+    to `max_wait_ms` (or until `max_batch_size` queries are queued), runs one forward
+    pass over the whole batch and hands every caller its own vector.
+    """
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE,
+        max_wait_ms: float = EMBEDDING_BATCH_MAX_WAIT_MS,
+    ):
+        """
+        Args:
+            embed_model: underlying embedding model, e.g. HuggingFaceEmbedding
+            max_batch_size: maximum queries per forward pass
+            max_wait_ms: how long the first query of a batch waits for company
+        """
+        self.embed_model = embed_model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+
+        self.batches = 0
+        self.queries = 0
+        self.largest_batch = 0
+
+    def _ensure_started(self):
+        # The worker thread is started lazily, and restarted after a fork (Celery prefork) or if it died
+        if self._running():
+            return
+        with self._start_lock:
+            if self._running():
+                return
+            if self._pid == os.getpid():
+                # Queries already queued are picked up by the new thread
+                print("⚠️ Embedding batcher thread died, restarting it")
+            else:
+                self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _running(self) -> bool:
+        return self._pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+
+    def submit(self, query: str) -> Future:
+        """Queue a query and return a Future resolving to its embedding."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((query, future))
+        return future
+
+    def embed_query(self, query: str) -> Embedding:
+        return self.submit(query).result()
+
+    async def aembed_query(self, query: str) -> Embedding:
+        return await asyncio.wrap_future(self.submit(query))
+
+    def _collect_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _embed_batch(self, queries: List[str]) -> List[Embedding]:
+        # A HuggingFaceEmbedding without a query instruction embeds queries like texts,
+        # so the public batch call encodes them all in one pass
+        model = self.embed_model
+        if isinstance(model, HuggingFaceEmbedding) and model.query_instruction == model.text_instruction:
+            return model.get_text_embedding_batch(queries)
+        return [model.get_query_embedding(query) for query in queries]
+
+    def _run(self):
+        while True:
+            # Callers that were cancelled while queued are dropped; the others can no longer be cancelled
+            batch = [(query, future) for query, future in self._collect_batch() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                embeddings = self._embed_batch([query for query, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    self._hand_off(future, exception=e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                self._hand_off(future, result=embedding)
+
+            self.batches += 1
+            self.queries += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+    @staticmethod
+    def _hand_off(future: Future, result=None, exception=None):
+        # Never let one caller's future take down the thread every other caller waits on
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except Exception as e:
+            print(f"⚠️ Embedding batcher could not hand off a result: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
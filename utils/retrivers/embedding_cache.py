@@ -0,0 +1,138 @@
+import hashlib
+import os
+from typing import Any, List, Optional
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from utils.cache.redis_cache import RedisCacheTier
+from utils.cache.ttl_lru_cache import TTLLRUCache
+from utils.retrivers.embedding_batcher import EmbeddingMicroBatcher
+from utils.tools.query_normalizer import normalize_query
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", "86400"))
+
+
+class CachedQueryEmbedding(BaseEmbedding):
+    """
+    Wraps an embedding model with a query-embedding cache.
+
+    Lookups go to a bounded in-process LRU/TTL cache first, then to an optional
+    Redis tier shared by all workers. Only misses run the model's forward pass, through
+    the micro-batcher when one is given. Text (document) embeddings are passed straight through.
+    """
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _batcher: Optional[EmbeddingMicroBatcher] = PrivateAttr()
+    _local: TTLLRUCache = PrivateAttr()
+    _shared: Optional[RedisCacheTier] = PrivateAttr()
+    _shared_hits: int = PrivateAttr(default=0)
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        max_size: int = EMBEDDING_CACHE_SIZE,
+        ttl_seconds: int = EMBEDDING_CACHE_TTL,
+        shared_tier: Optional[RedisCacheTier] = None,
+        batcher: Optional[EmbeddingMicroBatcher] = None,
+        **kwargs: Any,
+    ):
+        """
+        Args:
+            embed_model: underlying embedding model, e.g. HuggingFaceEmbedding
+            max_size: max entries of the in-process cache
+            ttl_seconds: lifetime of cached embeddings
+            shared_tier: optional Redis tier shared across Celery workers
+            batcher: optional micro-batcher used to embed cache misses
+        """
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            **kwargs,
+        )
+        self._embed_model = embed_model
+        self._local = TTLLRUCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self._shared = shared_tier
+        self._shared_hits = 0
+        self._batcher = batcher
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedQueryEmbedding"
+
+    @property
+    def embed_model(self) -> BaseEmbedding:
+        return self._embed_model
+
+    def _cache_key(self, query: str) -> str:
+        normalized = normalize_query(query, strip_punctuation=True)
+        return hashlib.sha1(f"{self.model_name}|{normalized}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str) -> Optional[Embedding]:
+        embedding = self._local.get(key)
+        if embedding is not None:
+            return list(embedding)
+
+        if self._shared is not None:
+            raw = self._shared.get(key)
+            if raw is not None:
+                embedding = np.frombuffer(raw, dtype=np.float32).tolist()
+                self._local.set(key, embedding)
+                self._shared_hits += 1
+                return list(embedding)
+        return None
+
+    def _store(self, key: str, embedding: Embedding):
+        self._local.set(key, list(embedding))
+        if self._shared is not None:
+            self._shared.set(key, np.asarray(embedding, dtype=np.float32).tobytes())
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        key = self._cache_key(query)
+        embedding = self._lookup(key)
+        if embedding is None:
+            if self._batcher is not None:
+                embedding = self._batcher.embed_query(query)
+            else:
+                embedding = self._embed_model.get_query_embedding(query)
+            self._store(key, embedding)
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        key = self._cache_key(query)
+        embedding = self._lookup(key)
+        if embedding is None:
+            if self._batcher is not None:
+                embedding = await self._batcher.aembed_query(query)
+            else:
+                embedding = await self._embed_model.aget_query_embedding(query)
+            self._store(key, embedding)
+        return embedding
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._embed_model.get_text_embedding(text)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return await self._embed_model.aget_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._embed_model.get_text_embedding_batch(texts)
+
+    def cache_stats(self) -> dict:
+        """
+        Returns: hit/miss counters of both tiers and the overall hit rate
+        """
+        local = self._local.stats()
+        misses = local["misses"] - self._shared_hits
+        hits = local["hits"] + self._shared_hits
+        lookups = hits + misses
+        return {
+            "local": local,
+            "shared": self._shared.stats() if self._shared is not None else None,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "batching": self._batcher.stats() if self._batcher is not None else None,
+        }
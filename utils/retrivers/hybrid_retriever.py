@@ -0,0 +1,64 @@
+from typing import Callable, List, Sequence
+
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import BaseNode, NodeWithScore, QueryBundle
+
+from utils.retrivers.bm25_index import BM25Index, reciprocal_rank_fusion
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Combines vector similarity hits with BM25 hits through reciprocal-rank fusion.
+
+    Exact statute terms ("bail", "Section 364") that MiniLM ranks low are pulled up by
+    the lexical side; fused scores replace the cosine scores on the returned nodes.
+    """
+
+    def __init__(
+        self,
+        vector_retriever: BaseRetriever,
+        bm25_index: BM25Index,
+        fetch_nodes: Callable[[Sequence[str]], List[BaseNode]],
+        similarity_top_k: int = 10,
+        candidate_top_k: int = 20,
+        rrf_k: int = 60,
+    ):
+        """
+        Args:
+            vector_retriever: dense retriever returning `candidate_top_k` nodes
+            bm25_index: lexical index of the same category
+            fetch_nodes: loads nodes by id for lexical-only hits
+            similarity_top_k: number of fused results returned
+            candidate_top_k: number of candidates taken from each side
+            rrf_k: reciprocal-rank fusion constant
+        """
+        super().__init__()
+        self.vector_retriever = vector_retriever
+        self.bm25_index = bm25_index
+        self.fetch_nodes = fetch_nodes
+        self.similarity_top_k = similarity_top_k
+        self.candidate_top_k = candidate_top_k
+        self.rrf_k = rrf_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        vector_hits = self.vector_retriever.retrieve(query_bundle)
+        lexical_hits = self.bm25_index.search(query_bundle.query_str, top_k=self.candidate_top_k)
+
+        fused = reciprocal_rank_fusion(
+            [
+                [hit.node.node_id for hit in vector_hits],
+                [doc_id for doc_id, _ in lexical_hits],
+            ],
+            k=self.rrf_k,
+        )[: self.similarity_top_k]
+
+        nodes_by_id = {hit.node.node_id: hit.node for hit in vector_hits}
+        missing = [doc_id for doc_id, _ in fused if doc_id not in nodes_by_id]
+        for node in self.fetch_nodes(missing):
+            nodes_by_id[node.node_id] = node
+
+        return [
+            NodeWithScore(node=nodes_by_id[doc_id], score=score)
+            for doc_id, score in fused
+            if doc_id in nodes_by_id
+        ]
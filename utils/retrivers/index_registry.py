@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+# Memory budget for resident category indexes (MB). 0 disables eviction.
+DEFAULT_MAX_MB = float(os.getenv("INDEX_REGISTRY_MAX_MB", "1024"))
+
+# Rough cost of one embedding value kept as a Python float inside a list
+# (8 byte list slot + 24 byte float object).
+_PY_FLOAT_BYTES = 32
+
+
+@dataclass
+class LoadedCategoryIndex:
+    """
+    Everything needed to serve retrieval for one category.
+    """
+    category: str
+    index: Any
+    retriever: Any
+    nbytes: int
+    load_seconds: float
+    hybrid_retriever: Any = None
+    version: str = "unversioned"
+
+
+def estimate_index_nbytes(index) -> int:
+    """
+    Approximate resident size of a loaded VectorStoreIndex.
+    Args:
+        index: loaded llama_index VectorStoreIndex
+
+    Returns: estimated size in bytes
+
+    """
+    nbytes = 0
+    storage_context = index.storage_context
+
+    vector_store = storage_context.vector_store
+    if hasattr(vector_store, "nbytes"):
+        nbytes += int(vector_store.nbytes)
+    else:
+        embedding_dict = getattr(getattr(vector_store, "data", None), "embedding_dict", None) or {}
+        for embedding in embedding_dict.values():
+            nbytes += len(embedding) * _PY_FLOAT_BYTES
+
+    docs = getattr(storage_context.docstore, "docs", None) or {}
+    for node in docs.values():
+        nbytes += len(getattr(node, "text", "") or "")
+
+    return nbytes
+
+
+class IndexRegistry:
+    """
+    Per-process registry of loaded category indexes.
+
+    Each category is loaded once and shared by every thread of the process. When the
+    estimated resident size goes over the memory budget the least recently used
+    categories are evicted and will be loaded again on their next request.
+    """
+
+    def __init__(self, loader: Callable[[str], LoadedCategoryIndex], max_mb: Optional[float] = None):
+        """
+        Args:
+            loader: function category -> LoadedCategoryIndex
+            max_mb: memory budget in MB, defaults to INDEX_REGISTRY_MAX_MB
+        """
+        self._loader = loader
+        max_mb = DEFAULT_MAX_MB if max_mb is None else max_mb
+        self.max_bytes = int(max_mb * 1024 * 1024)
+
+        self._entries: "OrderedDict[str, LoadedCategoryIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._resident_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, category: str) -> LoadedCategoryIndex:
+        """
+        Return the loaded index for a category, loading it on first use.
+        Concurrent requests for a cold category wait for a single load.
+        """
+        with self._lock:
+            entry = self._entries.get(category)
+            if entry is not None:
+                self._entries.move_to_end(category)
+                self.hits += 1
+                return entry
+
+        with self.load_lock(category):
+            # Another thread may have finished loading while we waited
+            with self._lock:
+                entry = self._entries.get(category)
+                if entry is not None:
+                    self._entries.move_to_end(category)
+                    self.hits += 1
+                    return entry
+                self.misses += 1
+
+            start = time.time()
+            entry = self._loader(category)
+            entry.load_seconds = round(time.time() - start, 3)
+            print(f"📦 Loaded index '{category}' ({entry.version}) in {entry.load_seconds}s (~{entry.nbytes / 1e6:.1f} MB)")
+
+            with self._lock:
+                self._entries[category] = entry
+                self._resident_bytes += entry.nbytes
+                self._evict_over_budget(keep=category)
+            return entry
+
+    def load_lock(self, category: str) -> threading.Lock:
+        """Lock held while a category loads, until its entry is resident."""
+        with self._lock:
+            return self._load_locks.setdefault(category, threading.Lock())
+
+    def _evict_over_budget(self, keep: str):
+        """Evict least recently used categories until under budget. Caller holds the lock."""
+        if self.max_bytes <= 0:
+            return
+        while self._resident_bytes > self.max_bytes and len(self._entries) > 1:
+            category, entry = next(iter(self._entries.items()))
+            if category == keep:
+                break
+            del self._entries[category]
+            self._resident_bytes -= entry.nbytes
+            self.evictions += 1
+            print(f"♻️ Evicted index '{category}' (~{entry.nbytes / 1e6:.1f} MB)")
+
+    def replace(self, category: str, entry: LoadedCategoryIndex) -> bool:
+        """
+        Swap in a freshly loaded entry for a resident category. Requests already holding
+        the old entry finish on it; every later get() sees the new one.
+        Returns: False when the category is not resident (it will load the new version on next use)
+        """
+        with self._lock:
+            old = self._entries.get(category)
+            if old is None:
+                return False
+            self._entries[category] = entry
+            # The fresh entry is the most recently used, so eviction starts from the others
+            self._entries.move_to_end(category)
+            self._resident_bytes += entry.nbytes - old.nbytes
+            self._evict_over_budget(keep=category)
+        print(f"🔁 Swapped index '{category}': {old.version} -> {entry.version}")
+        return True
+
+    def resident_version(self, category: str) -> Optional[str]:
+        """Returns: version of the resident entry, None when the category is not loaded"""
+        with self._lock:
+            entry = self._entries.get(category)
+            return entry.version if entry is not None else None
+
+    def invalidate(self, category: str):
+        """Drop a category so it is reloaded on next use."""
+        with self._lock:
+            entry = self._entries.pop(category, None)
+            if entry is not None:
+                self._resident_bytes -= entry.nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "resident_categories": list(self._entries.keys()),
+                "versions": {category: entry.version for category, entry in self._entries.items()},
+                "resident_mb": round(self._resident_bytes / (1024 * 1024), 2),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+            }
@@ -0,0 +1,150 @@
+import os
+import shutil
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# Layout of a versioned category directory:
+#   <category>/CURRENT              -> name of the active version
+#   <category>/versions/<version>/  -> one complete, immutable index snapshot
+# Category directories without CURRENT are read as a single unversioned snapshot.
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+UNVERSIONED = "unversioned"
+
+# Seconds between checks of the CURRENT pointers in running workers
+INDEX_VERSION_POLL_SECONDS = float(os.getenv("INDEX_VERSION_POLL_SECONDS", "10"))
+
+# Snapshots kept on disk after publishing a new one (older ones are removed)
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))
+
+
+def new_version_id() -> str:
+    """Sortable version name, e.g. '20241102T101500.123-48213'."""
+    now = time.time()
+    return f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}.{int(now * 1000) % 1000:03d}-{os.getpid()}"
+
+
+def read_current_version(category_dir: str) -> Optional[str]:
+    path = os.path.join(category_dir, CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip() or None
+
+
+def resolve_index_dir(category_dir: str) -> Tuple[str, str]:
+    """
+    Returns: (directory holding the active snapshot, its version)
+    """
+    version = read_current_version(category_dir)
+    if version is None:
+        return category_dir, UNVERSIONED
+    return os.path.join(category_dir, VERSIONS_DIR, version), version
+
+
+def staging_dir(category_dir: str, version: str) -> str:
+    """Directory a new snapshot is written to before it is published."""
+    return os.path.join(category_dir, VERSIONS_DIR, f".staging-{version}")
+
+
+def publish_version(category_dir: str, staged_dir: str, version: str):
+    """
+    Move a fully written snapshot into versions/ and flip CURRENT to it.
+    Readers see either the old or the new pointer, never a partial index.
+    """
+    versions_dir = os.path.join(category_dir, VERSIONS_DIR)
+    os.makedirs(versions_dir, exist_ok=True)
+    os.rename(staged_dir, os.path.join(versions_dir, version))
+
+    pointer = os.path.join(category_dir, CURRENT_FILE)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer + ".tmp", pointer)
+
+    prune_versions(category_dir, keep=INDEX_KEEP_VERSIONS)
+
+
+def prune_versions(category_dir: str, keep: int):
+    """
+    Remove old snapshots, keeping the active one and the `keep` most recent.
+    Workers still serving a removed snapshot keep their open files until they swap.
+    """
+    versions_dir = os.path.join(category_dir, VERSIONS_DIR)
+    if keep <= 0 or not os.path.isdir(versions_dir):
+        return
+    current = read_current_version(category_dir)
+    versions = sorted(name for name in os.listdir(versions_dir) if not name.startswith("."))
+    for name in versions[:-keep]:
+        if name != current:
+            shutil.rmtree(os.path.join(versions_dir, name), ignore_errors=True)
+
+
+class IndexVersionWatcher:
+    """
+    Background thread that polls the CURRENT pointer of every category and reports
+    new versions. Started lazily, and again after a fork, like the embedding batcher.
+    """
+
+    def __init__(
+        self,
+        index_dirs_by_category: dict,
+        on_new_version: Callable[[str, str], bool],
+        poll_seconds: float = INDEX_VERSION_POLL_SECONDS,
+    ):
+        """
+        Args:
+            index_dirs_by_category: Dict of category -> category directory
+            on_new_version: called as on_new_version(category, version) from the watcher thread,
+                            returns True when it swapped a resident index
+            poll_seconds: seconds between checks, 0 disables the watcher
+        """
+        self.index_dirs = index_dirs_by_category
+        self.on_new_version = on_new_version
+        self.poll_seconds = poll_seconds
+
+        self._versions: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self.swaps = 0
+
+    def ensure_started(self):
+        if self.poll_seconds <= 0:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            # Remember what is on disk now; only later changes trigger a swap
+            self._versions = self._read_versions()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="index-version-watcher", daemon=True)
+            self._thread.start()
+
+    def _read_versions(self) -> Dict[str, str]:
+        versions = {}
+        for category, category_dir in self.index_dirs.items():
+            if isinstance(category_dir, str):
+                versions[category] = resolve_index_dir(category_dir)[1]
+        return versions
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                for category, version in self._read_versions().items():
+                    if self._versions.get(category) == version:
+                        continue
+                    print(f"🔄 New index version for '{category}': {version}")
+                    swapped = self.on_new_version(category, version)
+                    self._versions[category] = version
+                    if swapped:
+                        self.swaps += 1
+            except Exception as e:
+                # Keep serving the current snapshot and try again on the next poll
+                print(f"⚠️ Index version check failed: {e}")
+
+    def stats(self) -> dict:
+        return {"swaps": self.swaps, "versions": dict(self._versions)}
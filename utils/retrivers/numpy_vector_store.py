@@ -0,0 +1,226 @@
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+from utils.retrivers.sqlite_node_store import SqliteNodeStore, has_node_store
+
+# Files written next to the llama_index stores of a category
+VECTORS_FILE = "vectors.npy"
+VECTOR_IDS_FILE = "vector_ids.json"
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def has_numpy_vector_store(persist_dir: str) -> bool:
+    """Check whether a persisted category index uses the numpy backend."""
+    return os.path.exists(os.path.join(persist_dir, VECTORS_FILE))
+
+
+class NumpyVectorStore(BasePydanticVectorStore):
+    """
+    Vector store keeping all embeddings of a category in one contiguous float32 matrix.
+
+    Rows are L2 normalized when written so cosine similarity is a single
+    matrix-vector product. Persisted stores are opened with np.memmap, so loading is
+    O(1) and several worker processes share the same pages through the OS page cache.
+
+    With a SqliteNodeStore attached the store also keeps the node text, and queries
+    only read the text and metadata of the returned hits.
+    """
+
+    stores_text: bool = False
+
+    _matrix: np.ndarray = PrivateAttr()
+    _ids: List[str] = PrivateAttr()
+    _ref_doc_ids: List[Optional[str]] = PrivateAttr()
+    _node_store: Optional[SqliteNodeStore] = PrivateAttr()
+    _row_by_id: Optional[Dict[str, int]] = PrivateAttr()
+
+    def __init__(
+        self,
+        matrix: Optional[np.ndarray] = None,
+        ids: Optional[List[str]] = None,
+        ref_doc_ids: Optional[List[Optional[str]]] = None,
+        node_store: Optional[SqliteNodeStore] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(stores_text=node_store is not None, **kwargs)
+        self._node_store = node_store
+        self._matrix = matrix if matrix is not None else np.zeros((0, 0), dtype=np.float32)
+        self._ids = list(ids or [])
+        self._ref_doc_ids = list(ref_doc_ids or [None] * len(self._ids))
+        self._row_by_id = None
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "NumpyVectorStore"
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, writable: bool = False) -> "NumpyVectorStore":
+        """
+        Open a persisted store without reading the vectors into memory.
+        Args:
+            persist_dir: category index directory
+            writable: load the node store as an in-memory copy that can be modified and persisted elsewhere
+
+        Returns: NumpyVectorStore backed by a read-only memmap
+
+        """
+        matrix = np.load(os.path.join(persist_dir, VECTORS_FILE), mmap_mode="r")
+        with open(os.path.join(persist_dir, VECTOR_IDS_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        node_store = None
+        if has_node_store(persist_dir):
+            if writable:
+                node_store = SqliteNodeStore.load_copy(persist_dir)
+            else:
+                node_store = SqliteNodeStore.from_persist_dir(persist_dir)
+        return cls(matrix=matrix, ids=meta["ids"], ref_doc_ids=meta["ref_doc_ids"], node_store=node_store)
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    @property
+    def nbytes(self) -> int:
+        return int(self._matrix.nbytes)
+
+    @property
+    def node_store(self) -> Optional[SqliteNodeStore]:
+        return self._node_store
+
+    def add(self, nodes: Sequence[BaseNode], **kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+
+        new_rows = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        new_rows = _normalize_rows(new_rows)
+
+        if self._matrix.size == 0:
+            self._matrix = new_rows
+        else:
+            self._matrix = np.vstack([self._matrix, new_rows])
+
+        new_ids = [node.node_id for node in nodes]
+        self._ids.extend(new_ids)
+        self._row_by_id = None
+        self._ref_doc_ids.extend(node.ref_doc_id for node in nodes)
+        if self._node_store is not None:
+            self._node_store.add_nodes(nodes)
+        return new_ids
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        keep = [i for i, doc_id in enumerate(self._ref_doc_ids) if doc_id != ref_doc_id]
+        if len(keep) == len(self._ids):
+            return
+        self._matrix = np.array(self._matrix[keep], dtype=np.float32)
+        self._ids = [self._ids[i] for i in keep]
+        self._ref_doc_ids = [self._ref_doc_ids[i] for i in keep]
+        self._row_by_id = None
+        if self._node_store is not None:
+            self._node_store.delete_ref_doc(ref_doc_id)
+
+    def delete_nodes(
+        self,
+        node_ids: Optional[List[str]] = None,
+        filters: Optional[Any] = None,
+        **delete_kwargs: Any,
+    ) -> None:
+        if filters is not None:
+            raise NotImplementedError("Metadata filters are not supported by NumpyVectorStore.")
+        to_delete = set(node_ids or [])
+        keep = [i for i, node_id in enumerate(self._ids) if node_id not in to_delete]
+        if len(keep) == len(self._ids):
+            return
+        self._matrix = np.array(self._matrix[keep], dtype=np.float32)
+        self._ids = [self._ids[i] for i in keep]
+        self._ref_doc_ids = [self._ref_doc_ids[i] for i in keep]
+        self._row_by_id = None
+        if self._node_store is not None:
+            self._node_store.delete_nodes(list(to_delete))
+
+    def get_vectors(self, node_ids: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Stored (normalized) vectors of the given nodes, without embedding anything.
+        Args:
+            node_ids: ids of indexed nodes
+
+        Returns: one vector per id, None for ids that are not in the store
+        """
+        if self._row_by_id is None:
+            self._row_by_id = {node_id: row for row, node_id in enumerate(self._ids)}
+        rows = [self._row_by_id.get(node_id) for node_id in node_ids]
+        return [np.array(self._matrix[row], dtype=np.float32) if row is not None else None for row in rows]
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.filters is not None:
+            raise NotImplementedError("Metadata filters are not supported by NumpyVectorStore.")
+        if query.query_embedding is None or not self._ids:
+            return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+
+        query_vector = np.asarray(query.query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query_vector)
+        if norm > 0:
+            query_vector = query_vector / norm
+
+        # One matrix-vector product, then a partial sort of the top k rows
+        scores = self._matrix @ query_vector
+        top_k = min(query.similarity_top_k, scores.shape[0])
+        if top_k <= 0:
+            return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+        top_rows = np.argpartition(-scores, top_k - 1)[:top_k]
+        top_rows = top_rows[np.argsort(-scores[top_rows])]
+
+        top_ids = [self._ids[row] for row in top_rows]
+        similarities = [float(scores[row]) for row in top_rows]
+        if self._node_store is None:
+            return VectorStoreQueryResult(nodes=None, similarities=similarities, ids=top_ids)
+
+        # Materialize only the hits
+        nodes_by_id = {node.node_id: node for node in self._node_store.get_nodes(top_ids)}
+        hits = [(nodes_by_id[node_id], score) for node_id, score in zip(top_ids, similarities) if node_id in nodes_by_id]
+        return VectorStoreQueryResult(
+            nodes=[node for node, _ in hits],
+            similarities=[score for _, score in hits],
+            ids=[node.node_id for node, _ in hits],
+        )
+
+    def persist(self, persist_path: str, fs: Optional[Any] = None) -> None:
+        """
+        Write the matrix as a .npy file next to the other llama_index stores.
+        Args:
+            persist_path: path llama_index would use for the json vector store,
+                only its directory is used
+            fs: unused, local filesystem only
+
+        """
+        persist_dir = os.path.dirname(persist_path)
+        os.makedirs(persist_dir, exist_ok=True)
+
+        vectors_path = os.path.join(persist_dir, VECTORS_FILE)
+        tmp_vectors_path = vectors_path + ".tmp"
+        with open(tmp_vectors_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(self._matrix, dtype=np.float32))
+        os.replace(tmp_vectors_path, vectors_path)
+
+        ids_path = os.path.join(persist_dir, VECTOR_IDS_FILE)
+        tmp_ids_path = ids_path + ".tmp"
+        with open(tmp_ids_path, "w", encoding="utf-8") as f:
+            json.dump({"ids": self._ids, "ref_doc_ids": self._ref_doc_ids}, f)
+        os.replace(tmp_ids_path, ids_path)
+
+        if self._node_store is not None:
+            self._node_store.persist(persist_dir)
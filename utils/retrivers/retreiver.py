@@ -1,36 +1,233 @@
-from llama_index.core import StorageContext, load_index_from_storage
+import os
+import time
+
+from llama_index.core import StorageContext, VectorStoreIndex, load_index_from_storage
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 
+from utils.retrivers.bm25_index import BM25Index, has_bm25_index
+from utils.retrivers.hybrid_retriever import HybridRetriever
+from utils.retrivers.index_registry import IndexRegistry, LoadedCategoryIndex, estimate_index_nbytes
+from utils.retrivers.index_versions import UNVERSIONED, IndexVersionWatcher, resolve_index_dir
+from utils.retrivers.numpy_vector_store import NumpyVectorStore, has_numpy_vector_store
+from utils.retrivers.section_index import SectionLookup
+from utils.retrivers.sqlite_node_store import has_node_store
+
+SIMILARITY_TOP_K = 10
+
+# "hybrid" fuses BM25 and vector hits when a category has a lexical index, "vector" is dense only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+HYBRID_CANDIDATE_TOP_K = int(os.getenv("HYBRID_CANDIDATE_TOP_K", "20"))
+
+
 class AutomergingRetriverInit:
-    def __init__(self, storage_contexts_by_category: dict, embed_model):
+    def __init__(self, index_dirs_by_category: dict, embed_model, max_index_mb: float = None):
         """
         Args:
-            storage_contexts_by_category: Dict of category -> StorageContext
+            index_dirs_by_category: Dict of category -> persist dir (or a prebuilt StorageContext)
             embed_model: Preloaded HuggingFaceEmbedding
+            max_index_mb: Memory budget for resident indexes, defaults to INDEX_REGISTRY_MAX_MB
         """
-        self.storage_contexts = storage_contexts_by_category
+        self.index_dirs = index_dirs_by_category
         self.embed_model = embed_model
+        self.registry = IndexRegistry(self._load_category, max_mb=max_index_mb)
+        self.section_lookup = SectionLookup(index_dirs_by_category)
+        # New snapshots published by add_database.py are loaded and swapped in without a restart
+        self.version_watcher = IndexVersionWatcher(index_dirs_by_category, self._on_new_version)
+        self._version_listeners = []
+
+    def _load_category(self, category: str) -> LoadedCategoryIndex:
+        """
+        Build the index and retriever of one category from its persisted stores.
+        """
+        source = self.index_dirs[category]
+        version = UNVERSIONED
+        if isinstance(source, str):
+            source, version = resolve_index_dir(source)
+
+        if isinstance(source, StorageContext):
+            base_index = load_index_from_storage(source, embed_model=self.embed_model)
+        elif has_numpy_vector_store(source) and has_node_store(source):
+            # Embeddings are memory mapped and node texts stay on disk until they are hit
+            base_index = VectorStoreIndex.from_vector_store(
+                NumpyVectorStore.from_persist_dir(source),
+                embed_model=self.embed_model,
+            )
+        elif has_numpy_vector_store(source):
+            storage_context = StorageContext.from_defaults(
+                persist_dir=source,
+                vector_store=NumpyVectorStore.from_persist_dir(source),
+            )
+            base_index = load_index_from_storage(storage_context, embed_model=self.embed_model)
+        else:
+            storage_context = StorageContext.from_defaults(persist_dir=source)
+            base_index = load_index_from_storage(storage_context, embed_model=self.embed_model)
+
+        base_retriever = base_index.as_retriever(similarity_top_k=SIMILARITY_TOP_K)
+        nbytes = estimate_index_nbytes(base_index)
+
+        hybrid_retriever = None
+        if not isinstance(source, StorageContext) and has_bm25_index(source):
+            bm25_index = BM25Index.from_persist_dir(source)
+            hybrid_retriever = HybridRetriever(
+                vector_retriever=base_index.as_retriever(similarity_top_k=HYBRID_CANDIDATE_TOP_K),
+                bm25_index=bm25_index,
+                fetch_nodes=lambda node_ids: self._fetch_nodes(base_index, node_ids),
+                similarity_top_k=SIMILARITY_TOP_K,
+                candidate_top_k=HYBRID_CANDIDATE_TOP_K,
+            )
+            nbytes += bm25_index.nbytes
+
+        return LoadedCategoryIndex(
+            category=category,
+            index=base_index,
+            retriever=base_retriever,
+            nbytes=nbytes,
+            load_seconds=0.0,
+            hybrid_retriever=hybrid_retriever,
+            version=version,
+        )
 
-    def automerging_retrival_pipeline(self, query_str: str, category: str):
+    def add_version_listener(self, listener):
+        """
+        Args:
+            listener: function (category, version) called whenever a new snapshot is published
+        """
+        self._version_listeners.append(listener)
+
+    def _on_new_version(self, category: str, version: str) -> bool:
+        """
+        Load a newly published snapshot in the background and swap it in.
+        Categories that are not resident simply load the new version on next use.
+        Returns: True when a resident index was swapped
+        """
+        self.section_lookup.invalidate(category)
+        for listener in self._version_listeners:
+            try:
+                listener(category, version)
+            except Exception as e:
+                print(f"⚠️ Index version listener failed for '{category}': {e}")
+
+        # Waiting for a load in flight closes the gap where it read the old CURRENT pointer
+        # but was not resident yet: its entry is checked and replaced below like any other
+        with self.registry.load_lock(category):
+            resident_version = self.registry.resident_version(category)
+            if resident_version is None or resident_version == version:
+                return False
+            start = time.time()
+            entry = self._load_category(category)
+            entry.load_seconds = round(time.time() - start, 3)
+            return self.registry.replace(category, entry)
+
+    @staticmethod
+    def _fetch_nodes(base_index, node_ids):
+        """Load nodes by id from the SQLite node store, or the docstore for older indexes."""
+        node_store = getattr(base_index.vector_store, "node_store", None)
+        if node_store is not None:
+            return node_store.get_nodes(node_ids)
+        nodes = base_index.docstore.get_nodes(node_ids, raise_error=False)
+        return [node for node in nodes if node is not None]
+
+    def automerging_retrival_pipeline(self, query_str: str, category: str, mode: str = None):
         """
         Retrieve relevant documents from the correct category index.
         Args:
             query_str: User query
             category: e.g., 'law_of_crimes'
+            mode: 'hybrid' or 'vector', defaults to RETRIEVAL_MODE
         Returns:
             List of top matching text chunks
         """
-        if category not in self.storage_contexts:
-            raise ValueError(f"Category '{category}' not found in loaded storage contexts.")
+        base_nodes, _ = self.retrieve_with_version(query_str, category, mode)
+        return base_nodes
+
+    def retrieve_with_version(self, query_str: str, category: str, mode: str = None):
+        """
+        Same as automerging_retrival_pipeline.
+        Returns:
+            (top matching text chunks, version of the index snapshot that served them)
+        """
+        if category not in self.index_dirs:
+            raise ValueError(f"Category '{category}' not found in index directories.")
+        self.version_watcher.ensure_started()
+
+        # Index and retriever are built once per process and kept resident
+        loaded = self.registry.get(category)
+        mode = mode or RETRIEVAL_MODE
+        if mode == "hybrid" and loaded.hybrid_retriever is not None:
+            base_nodes = loaded.hybrid_retriever.retrieve(query_str)
+        else:
+            base_nodes = loaded.retriever.retrieve(query_str)
 
-        storage_context = self.storage_contexts[category]
+        return base_nodes, loaded.version
 
-        # Load index for the selected category
-        base_index = load_index_from_storage(storage_context, embed_model=self.embed_model)
+    def stored_vectors(self, category: str, node_ids, version: str):
+        """
+        Vectors the resident index stores for retrieved nodes, so they need not be embedded again.
+        Args:
+            category: category the nodes were retrieved from
+            node_ids: ids of the retrieved nodes
+            version: index version that served them (from retrieve_with_version)
+        Returns:
+            One normalized vector per id, None where unavailable (other backend, or the snapshot was swapped)
+        """
+        loaded = self.registry.get(category)
+        vector_store = loaded.index.vector_store
+        if loaded.version != version or not isinstance(vector_store, NumpyVectorStore):
+            return [None] * len(node_ids)
+        return vector_store.get_vectors(list(node_ids))
 
-        # Run retrieval
-        base_retriever = base_index.as_retriever(similarity_top_k=10)
-        base_nodes = base_retriever.retrieve(query_str)
+    def published_version(self, category: str) -> str:
+        """
+        Version of the category's current snapshot on disk (what the next retrieval will
+        serve once the watcher has swapped it in). Cheap: reads the CURRENT pointer only.
+        """
+        source = self.index_dirs.get(category)
+        if not isinstance(source, str):
+            return UNVERSIONED
+        return resolve_index_dir(source)[1]
 
-        return base_nodes
+    def serving_version(self, category: str) -> str:
+        """
+        Version the next retrieval of this process will serve: the resident snapshot, or the
+        published one when the category is not loaded yet (it is loaded from CURRENT).
+        Only a watcher swap between this call and the retrieval makes them differ; the
+        result then still reports the version that really served it (index_version).
+        """
+        resident_version = self.registry.resident_version(category)
+        return resident_version if resident_version is not None else self.published_version(category)
 
+    def serving_fingerprint(self) -> str:
+        """
+        Serving versions of every category in one string, for keys taken before routing
+        (when the category of a query is not known yet).
+        """
+        return ",".join(f"{category}={self.serving_version(category)}" for category in sorted(self.index_dirs))
+
+    def lookup_citation(self, query_str: str):
+        """
+        Answer direct statute lookups ("section 294 of the Penal Code") from the section index.
+        Args:
+            query_str: User query
+        Returns:
+            (citation dict, nodes where the section starts) or None when the query is not a plain lookup
+        """
+        self.version_watcher.ensure_started()
+        citation = self.section_lookup.lookup(query_str)
+        if citation is None:
+            return None
+
+        loaded = self.registry.get(citation["category"])
+        node_ids = [entry["node_id"] for entry in citation["entries"]]
+        nodes = self._fetch_nodes(loaded.index, node_ids)
+        if not nodes:
+            return None
+        citation["index_version"] = loaded.version
+        return citation, nodes
+
+    def registry_stats(self) -> dict:
+        """
+        Returns: hit / miss / eviction counters and resident versions of the index registry
+        """
+        stats = self.registry.stats()
+        stats["version_swaps"] = self.version_watcher.swaps
+        return stats
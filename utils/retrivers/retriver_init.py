@@ -1,29 +1,43 @@
 import os
-from llama_index.core import StorageContext
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 
+from utils.cache.redis_cache import RedisCacheTier
+from utils.retrivers.embedding_batcher import EmbeddingMicroBatcher
+from utils.retrivers.embedding_cache import CachedQueryEmbedding, EMBEDDING_CACHE_TTL
+
 # Base directory containing one folder per legal category
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 BASE_DIR = os.path.abspath(os.path.join(CURRENT_DIR, "../../databases/llama_index_dbs"))
 
-# Dictionary to hold storage contexts by legal category
-storage_contexts_by_category = {}
+# Dictionary to hold persisted index directories by legal category.
+# Stores are loaded lazily by AutomergingRetriverInit's index registry.
+index_dirs_by_category = {}
 
 # Shared embedding model for all categories
 # Load model name from env
 model_name = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
-embed_model = HuggingFaceEmbedding(model_name=model_name)
+hf_embed_model = HuggingFaceEmbedding(model_name=model_name)
+
+# Cache misses arriving together are embedded in one forward pass
+embedding_batching = os.getenv("EMBEDDING_BATCHING", "true").lower() == "true"
+
+# Repeated queries are served from the embedding cache (optionally shared through Redis)
+embed_model = CachedQueryEmbedding(
+    hf_embed_model,
+    shared_tier=RedisCacheTier.from_env("EMBEDDING_CACHE_REDIS_URL", prefix="emb", ttl_seconds=EMBEDDING_CACHE_TTL),
+    batcher=EmbeddingMicroBatcher(hf_embed_model) if embedding_batching else None,
+)
 
 # Walk through category directories
 for category in os.listdir(BASE_DIR):
     category_path = os.path.join(BASE_DIR, category)
     if os.path.isdir(category_path):
-        storage_contexts_by_category[category] = StorageContext.from_defaults(persist_dir=category_path)
+        index_dirs_by_category[category] = category_path
 
 def get_data_sources():
     """
     Returns:
-        - storage_contexts_by_category: dict like {'law_of_crimes': StorageContext(...) }
-        - embed_model: initialized embedding model
+        - index_dirs_by_category: dict like {'law_of_crimes': '/.../llama_index_dbs/law_of_crimes' }
+        - embed_model: initialized embedding model wrapped with the query-embedding cache
     """
-    return storage_contexts_by_category, embed_model
+    return index_dirs_by_category, embed_model
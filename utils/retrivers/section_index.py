@@ -0,0 +1,200 @@
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from llama_index.core.schema import BaseNode
+
+from utils.retrivers.index_versions import resolve_index_dir
+
+# File written next to the other stores of a category
+SECTION_INDEX_FILE = "sections.json"
+
+# Section headings start a line, sometimes after their marginal note:
+# "169. If the alteration ...", "4.Where any person ...", "238A. (1) At the ...", "Murder. 294. Except ..."
+# A marginal note is words without digits whose last word has three lowercase letters or more,
+# so abbreviations ("Act No. 5.", "Rs. 500.", "Cap. 19.") are not read as one
+_MARGINAL_NOTE = r"[A-Z](?:[A-Za-z ,;'()\-]{0,60}[a-z])?[a-z]{3}\.[ \t]+"
+_HEADING_RE = re.compile(rf"^[ \t]*(?:{_MARGINAL_NOTE})?(\d{{1,3}}[A-Z]{{0,2}})[ \t]*\.(?!\d)", re.MULTILINE)
+_CITATION_RE = re.compile(r"\b(?:section|sec)\s*(\d{1,3}[a-z]{0,2})\b")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+# Short names people use for the acts in data_sources, keyed by the act key derived from the file name
+ACT_ALIASES = {
+    "penal code": ["penal code", "pc"],
+    "code of criminal procedure": [
+        "code of criminal procedure",
+        "criminal procedure code",
+        "criminal procedure act",
+        "ccpa",
+        "cpc",
+    ],
+    "prevention of terrorism": ["prevention of terrorism act", "prevention of terrorism", "pta"],
+}
+
+# Words allowed around a citation for the query to count as a direct lookup
+_LOOKUP_FILLER_WORDS = {
+    "a", "about", "act", "content", "contents", "does", "explain", "give", "in", "is", "me", "of",
+    "please", "provide", "provides", "quote", "read", "say", "says", "show", "state", "states",
+    "tell", "text", "the", "under", "what", "whats",
+}
+
+
+def _normalize(text: str) -> str:
+    return _NON_ALNUM_RE.sub(" ", text.lower()).strip()
+
+
+def act_key_from_file_name(file_name: str) -> str:
+    """
+    Derive an act key from a source PDF name.
+    e.g. 'Penal-Code-Consolidated2024.pdf' -> 'penal code',
+         'Code-of-Criminal-Procedure-Act-No-15-of-1979-E.pdf' -> 'code of criminal procedure'
+    """
+    stem = _normalize(os.path.splitext(file_name)[0])
+    stem = re.sub(r"\bconsolidated\s*\d*\b", " ", stem)
+    stem = re.sub(r"consolidated\d*", " ", stem)
+    if "amendment" not in stem:
+        # Principal enactments are cited without their number and year
+        stem = re.sub(r"\bact no \d+ of \d{4}\b.*$", " ", stem)
+        stem = re.sub(r"\b\d{4}\b", " ", stem)
+    stem = re.sub(r"\be\b$", " ", stem.strip())
+    return re.sub(r"\s+", " ", stem).strip()
+
+
+def find_section_headings(text: str) -> List[tuple]:
+    """
+    Returns: list of (section number, character offset) for section headings in a chunk
+    """
+    return [(match.group(1).upper(), match.start(1)) for match in _HEADING_RE.finditer(text)]
+
+
+class SectionIndex:
+    """
+    Act + section number -> chunks and pages where that section starts, for one category.
+    """
+
+    def __init__(self, acts: Optional[dict] = None):
+        self.acts: Dict[str, dict] = acts or {}
+
+    @classmethod
+    def build(cls, nodes: Sequence[BaseNode]) -> "SectionIndex":
+        """
+        Parse section headings out of the indexed chunks.
+        Args:
+            nodes: chunks with `source_file` and `page_number` metadata
+
+        Returns: SectionIndex
+
+        """
+        acts: Dict[str, dict] = {}
+        for node in nodes:
+            source_file = node.metadata.get("source_file")
+            if not source_file:
+                continue
+            act_key = act_key_from_file_name(source_file)
+            act = acts.setdefault(act_key, {
+                "source_file": source_file,
+                "aliases": ACT_ALIASES.get(act_key, [act_key]),
+                "sections": {},
+            })
+            for section, offset in find_section_headings(node.get_content()):
+                act["sections"].setdefault(section, []).append({
+                    "node_id": node.node_id,
+                    "page_number": node.metadata.get("page_number"),
+                    "offset": offset,
+                })
+        return cls(acts)
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str) -> "SectionIndex":
+        with open(os.path.join(persist_dir, SECTION_INDEX_FILE), "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def persist(self, persist_dir: str):
+        os.makedirs(persist_dir, exist_ok=True)
+        path = os.path.join(persist_dir, SECTION_INDEX_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.acts, f)
+        os.replace(path + ".tmp", path)
+
+    def match_act(self, normalized_query: str) -> Optional[tuple]:
+        """
+        Returns: (act key, matched alias) of the longest act alias found in the query
+        """
+        best = None
+        for act_key, act in self.acts.items():
+            for alias in act["aliases"]:
+                if re.search(rf"\b{re.escape(alias)}\b", normalized_query):
+                    if best is None or len(alias) > len(best[1]):
+                        best = (act_key, alias)
+        return best
+
+
+def parse_direct_citation(query: str, section_index: SectionIndex) -> Optional[dict]:
+    """
+    Recognise queries that only ask for a provision, e.g. "what does section 300 of the Penal Code say".
+    Returns: {"act", "section", "entries"} or None when the query is anything more than a lookup
+    """
+    normalized = _normalize(query)
+    citation = _CITATION_RE.search(normalized)
+    if not citation:
+        return None
+    matched = section_index.match_act(normalized)
+    if not matched:
+        return None
+    act_key, alias = matched
+
+    # Everything except the citation itself must be filler words
+    remainder = re.sub(rf"\b{re.escape(alias)}\b", " ", normalized)
+    remainder = _CITATION_RE.sub(" ", remainder)
+    if any(word not in _LOOKUP_FILLER_WORDS for word in remainder.split()):
+        return None
+
+    section = citation.group(1).upper()
+    entries = section_index.acts[act_key]["sections"].get(section)
+    if not entries:
+        return None
+    return {"act": act_key, "section": section, "entries": entries}
+
+
+class SectionLookup:
+    """
+    Lazily loaded section indexes of all categories.
+    """
+
+    def __init__(self, index_dirs_by_category: dict):
+        self.index_dirs = index_dirs_by_category
+        self._indexes: Dict[str, Optional[SectionIndex]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, category: str) -> Optional[SectionIndex]:
+        with self._lock:
+            if category not in self._indexes:
+                persist_dir = self.index_dirs[category]
+                if isinstance(persist_dir, str):
+                    persist_dir = resolve_index_dir(persist_dir)[0]
+                path = os.path.join(persist_dir, SECTION_INDEX_FILE) if isinstance(persist_dir, str) else None
+                self._indexes[category] = (
+                    SectionIndex.from_persist_dir(persist_dir) if path and os.path.exists(path) else None
+                )
+            return self._indexes[category]
+
+    def invalidate(self, category: str):
+        with self._lock:
+            self._indexes.pop(category, None)
+
+    def lookup(self, query: str) -> Optional[dict]:
+        """
+        Returns: {"category", "act", "section", "source_file", "entries"} for a direct citation, else None
+        """
+        for category in self.index_dirs:
+            section_index = self._get(category)
+            if section_index is None:
+                continue
+            citation = parse_direct_citation(query, section_index)
+            if citation:
+                citation["category"] = category
+                citation["source_file"] = section_index.acts[citation["act"]]["source_file"]
+                return citation
+        return None
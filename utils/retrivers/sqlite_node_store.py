@@ -0,0 +1,152 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+
+# File written next to vectors.npy of a category
+NODE_STORE_FILE = "nodes.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    node_id TEXT PRIMARY KEY,
+    ref_doc_id TEXT,
+    source_file TEXT,
+    page_number TEXT,
+    text TEXT NOT NULL,
+    node_type TEXT NOT NULL,
+    node_content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_nodes_ref_doc_id ON nodes (ref_doc_id);
+"""
+
+
+def has_node_store(persist_dir: str) -> bool:
+    """Check whether a persisted category index keeps its nodes in SQLite."""
+    return os.path.exists(os.path.join(persist_dir, NODE_STORE_FILE))
+
+
+class SqliteNodeStore:
+    """
+    On-disk key-value store for chunk text and metadata, keyed by node id.
+
+    The retriever only reads the rows of the top-k hits, so node text is never
+    loaded for the rest of the corpus. New stores are built in memory by the
+    indexer and written to disk in one step with persist().
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: existing nodes.sqlite to open read-only, None for a new in-memory store
+        """
+        self.path = path
+        if path is None:
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+            self._conn.executescript(_SCHEMA)
+        else:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str) -> "SqliteNodeStore":
+        return cls(os.path.join(persist_dir, NODE_STORE_FILE))
+
+    @classmethod
+    def load_copy(cls, persist_dir: str) -> "SqliteNodeStore":
+        """
+        Load a persisted store into a writable in-memory copy (used for incremental re-indexing).
+        """
+        store = cls()
+        source = sqlite3.connect(f"file:{os.path.join(persist_dir, NODE_STORE_FILE)}?mode=ro", uri=True)
+        try:
+            source.backup(store._conn)
+        finally:
+            source.close()
+        return store
+
+    def add_nodes(self, nodes: Sequence[BaseNode]):
+        """
+        Store text, source_file, page_number and the serialized node (without embedding).
+        """
+        rows = []
+        for node in nodes:
+            node_meta = node_to_metadata_dict(node, remove_text=True)
+            page_number = node.metadata.get("page_number")
+            rows.append((
+                node.node_id,
+                node.ref_doc_id,
+                node.metadata.get("source_file"),
+                str(page_number) if page_number is not None else None,
+                node.get_content(),
+                node_meta["_node_type"],
+                node_meta["_node_content"],
+            ))
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def get_nodes(self, node_ids: Sequence[str]) -> List[BaseNode]:
+        """
+        Fetch nodes by id, in the order requested. Unknown ids are skipped.
+        """
+        if not node_ids:
+            return []
+        placeholders = ",".join("?" * len(node_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT node_id, text, node_type, node_content FROM nodes WHERE node_id IN ({placeholders})",
+                list(node_ids),
+            ).fetchall()
+
+        by_id: Dict[str, BaseNode] = {}
+        for node_id, text, node_type, node_content in rows:
+            by_id[node_id] = metadata_dict_to_node(
+                {"_node_type": node_type, "_node_content": node_content}, text=text
+            )
+        return [by_id[node_id] for node_id in node_ids if node_id in by_id]
+
+    def delete_ref_doc(self, ref_doc_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM nodes WHERE ref_doc_id = ?", (ref_doc_id,))
+            self._conn.commit()
+
+    def delete_nodes(self, node_ids: Sequence[str]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM nodes WHERE node_id = ?", [(node_id,) for node_id in node_ids])
+            self._conn.commit()
+
+    def iter_nodes(self) -> Iterator[BaseNode]:
+        """Yield every stored node (used to rebuild derived indexes)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT text, node_type, node_content FROM nodes").fetchall()
+        for text, node_type, node_content in rows:
+            yield metadata_dict_to_node({"_node_type": node_type, "_node_content": node_content}, text=text)
+
+    def iter_texts(self) -> Iterator[Tuple[str, str]]:
+        """Yield (node_id, text) for every stored node."""
+        with self._lock:
+            rows = self._conn.execute("SELECT node_id, text FROM nodes").fetchall()
+        yield from rows
+
+    def persist(self, persist_dir: str):
+        """
+        Write the store to <persist_dir>/nodes.sqlite, replacing any previous file atomically.
+        """
+        os.makedirs(persist_dir, exist_ok=True)
+        path = os.path.join(persist_dir, NODE_STORE_FILE)
+        if self.path is not None and os.path.abspath(self.path) == os.path.abspath(path):
+            return
+
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        dest = sqlite3.connect(tmp_path)
+        try:
+            with self._lock:
+                self._conn.backup(dest)
+        finally:
+            dest.close()
+        os.replace(tmp_path, path)
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import os
+import re
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from utils.task_results.result_waiter import CELERY_RESULT_BACKEND, TaskFailedError, result_waiter
+from utils.task_results.single_flight import coalesced_leader, shareable
+
+CHAT_EVENTS_REDIS_URL = os.getenv("CHAT_EVENTS_REDIS_URL", CELERY_RESULT_BACKEND)
+
+# Streams are short lived: they only have to outlive the SSE connection reading them
+CHAT_EVENTS_TTL = int(os.getenv("CHAT_EVENTS_TTL", "600"))
+CHAT_EVENTS_MAXLEN = int(os.getenv("CHAT_EVENTS_MAXLEN", "2000"))
+
+# Seconds an SSE connection stays open without any event, and the keep-alive interval
+CHAT_STREAM_TIMEOUT = float(os.getenv("CHAT_STREAM_TIMEOUT", "120"))
+CHAT_STREAM_KEEPALIVE_SECONDS = float(os.getenv("CHAT_STREAM_KEEPALIVE_SECONDS", "15"))
+
+# Words per "token" event when the final answer is streamed
+CHAT_STREAM_CHUNK_WORDS = int(os.getenv("CHAT_STREAM_CHUNK_WORDS", "4"))
+
+_CHUNK = re.compile(r"\S+\s*")
+
+
+def stream_key(task_id: str) -> str:
+    return f"chat-events:{task_id}"
+
+
+class ChatEventPublisher:
+    """
+    Worker side of /chat/stream: appends the progress of one chat to a Redis Stream.
+
+    Event types: "progress" (pipeline stage), "links" (citations, as soon as retrieval
+    returns), "token" (pieces of the final answer) and "done" (the dict process_chat returns).
+    A disabled publisher (non streaming chats) does nothing.
+    """
+
+    _client: Optional[redis.Redis] = None
+
+    def __init__(self, task_id: str, enabled: bool = True):
+        """
+        Args:
+            task_id: celery task id, which the API uses to find the stream
+            enabled: False turns every publish into a no-op
+        """
+        self.task_id = task_id
+        self.enabled = enabled
+        self.key = stream_key(task_id)
+
+    @classmethod
+    def client(cls) -> redis.Redis:
+        if cls._client is None:
+            cls._client = redis.Redis.from_url(CHAT_EVENTS_REDIS_URL)
+        return cls._client
+
+    def _append(self, events):
+        """Append (event, data) pairs in one round trip."""
+        if not self.enabled or not events:
+            return
+        try:
+            pipe = self.client().pipeline(transaction=False)
+            for event, data in events:
+                pipe.xadd(self.key, {"event": event, "data": json.dumps(data)}, maxlen=CHAT_EVENTS_MAXLEN, approximate=True)
+            pipe.expire(self.key, CHAT_EVENTS_TTL)
+            pipe.execute()
+        except redis.RedisError as e:
+            # Streaming is best effort: the chat result is still stored by Celery
+            print(f"⚠️ Chat event publish failed ({events[0][0]}): {e}")
+
+    def publish(self, event: str, data):
+        self._append([(event, data)])
+
+    def progress(self, stage: str, **details):
+        self.publish("progress", {"stage": stage, **details})
+
+    def answer(self, text: str, chunk_words: int = CHAT_STREAM_CHUNK_WORDS):
+        """Publish the final answer as a sequence of token events of a few words each."""
+        pieces = _CHUNK.findall(text)
+        self._append([
+            ("token", {"text": "".join(pieces[i:i + chunk_words])})
+            for i in range(0, len(pieces), chunk_words)
+        ])
+
+    def done(self, result: dict):
+        self.publish("done", result)
+
+
+_async_client: Optional[aioredis.Redis] = None
+
+
+def _events_client() -> aioredis.Redis:
+    # One pool for all SSE connections of this API process
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.from_url(CHAT_EVENTS_REDIS_URL)
+    return _async_client
+
+
+def format_sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def iter_chat_events(
+    task_id: str,
+    timeout: float = CHAT_STREAM_TIMEOUT,
+    resubmit: Optional[Callable[[dict], Awaitable[str]]] = None,
+) -> AsyncIterator[str]:
+    """
+    API side of /chat/stream: relays the task's events as SSE frames until "done".
+    Reading starts at the beginning of the stream, so nothing published before the
+    client connected is lost.
+
+    Whenever the stream is quiet the Celery result is checked too, so a task that failed
+    without publishing (worker lost, time limit) still ends the stream with "error", and
+    a result whose events were lost still ends it with "done".
+
+    A coalesced task (ChatSingleFlight) is followed to its leader's stream. When the leader
+    did not produce a shareable result, `resubmit` (coalesced result -> new task id) runs the
+    chat again and its stream is relayed instead.
+    """
+    client = _events_client()
+    coalesced = None  # pointer result of the duplicate task while its leader is relayed
+    loop = asyncio.get_running_loop()
+    idle_deadline = loop.time() + timeout
+    while True:
+        key = stream_key(task_id)
+        last_id = "0"
+        done = None  # (final frame, result), result None when the task failed
+        while done is None:
+            response = await client.xread({key: last_id}, count=100, block=int(CHAT_STREAM_KEEPALIVE_SECONDS * 1000))
+            if not response:
+                try:
+                    ready, result = await result_waiter.peek(task_id)
+                except TaskFailedError as e:
+                    done = (format_sse("error", json.dumps({"detail": str(e.info), "task_id": task_id})), None)
+                    break
+                if ready:
+                    done = (format_sse("done", json.dumps(result)), result)
+                    break
+                if loop.time() >= idle_deadline:
+                    # Still queued or running: the result stays available from GET /chat/{task_id}
+                    yield format_sse("error", json.dumps({"detail": "Timed out waiting for the chat.", "task_id": task_id}))
+                    return
+                yield ": keep-alive\n\n"
+                continue
+
+            idle_deadline = loop.time() + timeout
+            for entry_id, fields in response[0][1]:
+                last_id = entry_id
+                event = fields[b"event"].decode()
+                data = fields[b"data"].decode()
+                if event == "done":
+                    done = (format_sse(event, data), json.loads(data))
+                    break
+                yield format_sse(event, data)
+
+        frame, result = done
+        leader = coalesced_leader(result)
+        if leader is not None:
+            coalesced = result
+            task_id = leader
+            yield format_sse("progress", json.dumps({"stage": "coalesced", "task_id": task_id}))
+            continue
+        if coalesced is not None and not shareable(result) and resubmit is not None:
+            task_id = await resubmit(coalesced)
+            coalesced = None
+            yield format_sse("progress", json.dumps({"stage": "resubmitted", "task_id": task_id}))
+            continue
+        yield frame
+        return
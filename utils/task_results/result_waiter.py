@@ -0,0 +1,188 @@
+import asyncio
+import json
+import os
+from typing import Dict, List, Optional
+
+import redis.asyncio as aioredis
+
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+
+# Seconds the API waits for a chat result before answering 202 with the task id
+CHAT_RESULT_TIMEOUT = float(os.getenv("CHAT_RESULT_TIMEOUT", "100"))
+
+# Waits also re-read the result key this often, in case a pub/sub message was missed
+CHAT_RESULT_POLL_SECONDS = float(os.getenv("CHAT_RESULT_POLL_SECONDS", "5"))
+
+# Lifetime of the task id -> user mapping used to authorize GET /chat/{task_id}
+CHAT_TASK_OWNER_TTL = int(os.getenv("CHAT_TASK_OWNER_TTL", "3600"))
+
+# Celery's redis backend stores results under this key and publishes them on a channel of the same name
+TASK_META_PREFIX = "celery-task-meta-"
+READY_STATES = {"SUCCESS", "FAILURE", "REVOKED"}
+
+
+class TaskFailedError(Exception):
+    """
+    Raised when the awaited Celery task failed or was revoked
+    """
+    def __init__(self, task_id, state, info):
+        super().__init__(f"Task {task_id} finished with state {state}: {info}")
+        self.task_id = task_id
+        self.state = state
+        self.info = info
+
+
+class TaskResultWaiter:
+    """
+    Awaits Celery task results on the event loop instead of blocking in AsyncResult.get().
+
+    All waits share one Redis pub/sub connection: a reader task dispatches messages on
+    `celery-task-meta-<id>` channels to the futures waiting for them, so hundreds of
+    in-flight chats cost one connection and no threads.
+    """
+
+    def __init__(self, url: str = CELERY_RESULT_BACKEND):
+        """
+        Args:
+            url: redis url of the Celery result backend
+        """
+        self.url = url
+        self._redis: Optional[aioredis.Redis] = None
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._lock: Optional[asyncio.Lock] = None
+
+        self.waits = 0
+        self.completed_before_subscribe = 0
+        self.timeouts = 0
+
+    def _client(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.url)
+            self._lock = asyncio.Lock()
+        return self._redis
+
+    @staticmethod
+    def _channel(task_id: str) -> str:
+        return f"{TASK_META_PREFIX}{task_id}"
+
+    @staticmethod
+    def _ready_meta(raw) -> Optional[dict]:
+        """Decoded task meta when the task reached a ready state, else None (e.g. STARTED)."""
+        if raw is None:
+            return None
+        meta = json.loads(raw)
+        return meta if meta.get("status") in READY_STATES else None
+
+    @staticmethod
+    def _result(task_id: str, meta: dict):
+        if meta["status"] != "SUCCESS":
+            raise TaskFailedError(task_id, meta["status"], meta.get("result"))
+        return meta.get("result")
+
+    async def _read_messages(self):
+        while self._waiters:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except aioredis.RedisError as e:
+                # Waiters fall back to polling; the next wait opens a fresh pub/sub connection
+                print(f"⚠️ Task result pub/sub failed: {e}")
+                pubsub, self._pubsub = self._pubsub, None
+                await pubsub.aclose()
+                return
+            if message is None or message.get("type") != "message":
+                continue
+            channel = message["channel"].decode() if isinstance(message["channel"], bytes) else message["channel"]
+            meta = self._ready_meta(message["data"])
+            if meta is None:
+                continue
+            for future in self._waiters.get(channel, []):
+                if not future.done():
+                    future.set_result(meta)
+
+    async def _subscribe(self, channel: str, future: asyncio.Future):
+        client = self._client()
+        async with self._lock:
+            if self._pubsub is None:
+                self._pubsub = client.pubsub()
+                if self._waiters:
+                    await self._pubsub.subscribe(*self._waiters)
+            first = channel not in self._waiters
+            self._waiters.setdefault(channel, []).append(future)
+            if first:
+                await self._pubsub.subscribe(channel)
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._read_messages())
+
+    async def _unsubscribe(self, channel: str, future: asyncio.Future):
+        async with self._lock:
+            futures = self._waiters.get(channel, [])
+            if future in futures:
+                futures.remove(future)
+            if not futures and channel in self._waiters:
+                del self._waiters[channel]
+                if self._pubsub is not None:
+                    await self._pubsub.unsubscribe(channel)
+
+    async def wait(self, task_id: str, timeout: float = CHAT_RESULT_TIMEOUT):
+        """
+        Args:
+            task_id: celery task id
+            timeout: seconds to wait
+
+        Returns: the task's return value
+        Raises: asyncio.TimeoutError when it is not ready in time, TaskFailedError when it failed
+        """
+        self.waits += 1
+        channel = self._channel(task_id)
+        future = asyncio.get_running_loop().create_future()
+        await self._subscribe(channel, future)
+        try:
+            # The task may have finished before we subscribed
+            meta = self._ready_meta(await self._client().get(channel))
+            if meta is not None:
+                self.completed_before_subscribe += 1
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while meta is None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise asyncio.TimeoutError(f"Task {task_id} not ready after {timeout} seconds")
+                try:
+                    meta = await asyncio.wait_for(asyncio.shield(future), min(remaining, CHAT_RESULT_POLL_SECONDS))
+                except asyncio.TimeoutError:
+                    meta = self._ready_meta(await self._client().get(channel))
+            return self._result(task_id, meta)
+        finally:
+            await self._unsubscribe(channel, future)
+
+    async def peek(self, task_id: str):
+        """
+        Returns: (ready, result) without waiting; result is None while the task is pending
+        Raises: TaskFailedError when the task failed
+        """
+        meta = self._ready_meta(await self._client().get(self._channel(task_id)))
+        if meta is None:
+            return False, None
+        return True, self._result(task_id, meta)
+
+    async def set_owner(self, task_id: str, email: str):
+        await self._client().set(f"chat-owner:{task_id}", email, ex=CHAT_TASK_OWNER_TTL)
+
+    async def get_owner(self, task_id: str) -> Optional[str]:
+        owner = await self._client().get(f"chat-owner:{task_id}")
+        return owner.decode() if owner is not None else None
+
+    def stats(self) -> dict:
+        return {
+            "waits": self.waits,
+            "in_flight": sum(len(futures) for futures in self._waiters.values()),
+            "completed_before_subscribe": self.completed_before_subscribe,
+            "timeouts": self.timeouts,
+        }
+
+
+result_waiter = TaskResultWaiter()
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+from typing import Awaitable, Callable, Optional
+
+import redis.asyncio as aioredis
+
+from utils.task_results.result_waiter import CELERY_RESULT_BACKEND
+from utils.tools.query_normalizer import normalize_query
+
+CHAT_SINGLE_FLIGHT_ENABLED = os.getenv("CHAT_SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+CHAT_SINGLE_FLIGHT_REDIS_URL = os.getenv("CHAT_SINGLE_FLIGHT_REDIS_URL", CELERY_RESULT_BACKEND)
+
+# The lock outlives the slowest pipeline run; it is released as soon as the leader finishes
+CHAT_SINGLE_FLIGHT_LOCK_TTL = int(os.getenv("CHAT_SINGLE_FLIGHT_LOCK_TTL", "300"))
+
+# Followers that arrive just after the leader finished still pick up its result for this long
+CHAT_SINGLE_FLIGHT_RESULT_TTL = int(os.getenv("CHAT_SINGLE_FLIGHT_RESULT_TTL", "30"))
+
+# The API resubmits a duplicate whose leader failed with attempt + 1. Attempts below this are
+# coalesced again (one of the resubmitted duplicates leads), later ones run on their own
+CHAT_SINGLE_FLIGHT_ATTEMPTS = int(os.getenv("CHAT_SINGLE_FLIGHT_ATTEMPTS", "2"))
+
+# Status of a duplicate chat that points at its leader task instead of answering
+COALESCED_STATUS = "coalesced"
+
+# Delete the lock only if it is still ours (it may have expired and been taken by another leader)
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def shareable(result) -> bool:
+    """True for a result every duplicate of the query may be served (answers and blocks)."""
+    return isinstance(result, dict) and result.get("status") in ("success", "blocked")
+
+
+def coalesced_leader(result) -> Optional[str]:
+    """Leader task id of a COALESCED_STATUS result, None for any other result."""
+    if isinstance(result, dict) and result.get("status") == COALESCED_STATUS:
+        return result.get("leader_task_id")
+    return None
+
+
+class ChatSingleFlight:
+    """
+    Coalesces identical in-flight chats across all workers through Redis.
+
+    The first task for a (normalized query, index versions) key takes a SET NX lock
+    and runs routing and the pipeline. A duplicate claims before any guardrail,
+    classifier or retrieval work and does not wait in the worker: it returns a
+    COALESCED_STATUS pointer to the leader task right away, freeing its worker slot,
+    and the API serves the leader's Celery result or event stream. A duplicate arriving
+    just after the leader finished is given the leader's result directly.
+    """
+
+    def __init__(self, url: str = CHAT_SINGLE_FLIGHT_REDIS_URL, enabled: bool = CHAT_SINGLE_FLIGHT_ENABLED):
+        """
+        Args:
+            url: redis url shared by every worker
+            enabled: False runs every pipeline on its own
+        """
+        self.url = url
+        self.enabled = enabled
+        self._redis: Optional[aioredis.Redis] = None
+
+        self.leaders = 0
+        self.coalesced = 0
+        self.shared = 0
+        self.fallbacks = 0
+
+    def _client(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.url)
+        return self._redis
+
+    @staticmethod
+    def key(query: str, index_versions: str) -> str:
+        """
+        Args:
+            query: user query
+            index_versions: versions of every category the worker serves
+                            (the category is not known before routing)
+        """
+        normalized = normalize_query(query, strip_punctuation=True)
+        query_hash = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        versions_hash = hashlib.sha1(index_versions.encode("utf-8")).hexdigest()[:12]
+        return f"{versions_hash}:{query_hash}"
+
+    async def claim(self, key: str, owner: str) -> Optional[dict]:
+        """
+        Args:
+            key: output of ChatSingleFlight.key
+            owner: id of the calling task
+
+        Returns: None when the caller leads (it then runs the pipeline through lead), else
+                 {"leader": leader task id, "result": the leader's result, None while it runs}
+        """
+        if not self.enabled:
+            return None
+        client = self._client()
+        try:
+            # A lock released between the SET and the GET is claimed again
+            for _ in range(3):
+                raw = await client.get(f"sf:result:{key}")
+                if raw is not None:
+                    self.shared += 1
+                    return json.loads(raw)
+                if await client.set(f"sf:lock:{key}", owner, nx=True, ex=CHAT_SINGLE_FLIGHT_LOCK_TTL):
+                    self.leaders += 1
+                    return None
+                leader = await client.get(f"sf:lock:{key}")
+                if leader is not None:
+                    self.coalesced += 1
+                    return {"leader": leader.decode(), "result": None}
+        except aioredis.RedisError as e:
+            print(f"⚠️ Single-flight claim failed, running alone: {e}")
+        self.fallbacks += 1
+        return None
+
+    async def _release(self, key: str, owner: str, result: Optional[dict]):
+        """Keep the leader's result for late duplicates (None: nothing to share) and drop the lock."""
+        try:
+            pipe = self._client().pipeline(transaction=False)
+            if result is not None:
+                pipe.set(f"sf:result:{key}", json.dumps({"leader": owner, "result": result}), ex=CHAT_SINGLE_FLIGHT_RESULT_TTL)
+            pipe.eval(_RELEASE_SCRIPT, 1, f"sf:lock:{key}", owner)
+            await pipe.execute()
+        except aioredis.RedisError as e:
+            # The lock expires on its own after CHAT_SINGLE_FLIGHT_LOCK_TTL
+            print(f"⚠️ Single-flight release failed: {e}")
+
+    async def lead(self, key: str, owner: str, compute: Callable[[], Awaitable[dict]]) -> dict:
+        """
+        Run the pipeline as the leader of `key` (after claim returned None) and release it.
+        A result that is not shareable is not kept: the API resubmits the duplicates.
+        """
+        result = None
+        try:
+            result = await compute()
+            return result
+        finally:
+            if self.enabled:
+                await self._release(key, owner, result if shareable(result) else None)
+
+    def stats(self) -> dict:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "shared": self.shared,
+            "fallbacks": self.fallbacks,
+        }
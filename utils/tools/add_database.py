@@ -1,67 +1,353 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
 import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 from llama_index.core import VectorStoreIndex, StorageContext, SimpleDirectoryReader
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.core.schema import Document
+from llama_index.core.schema import Document, MetadataMode
+
+from utils.retrivers.bm25_index import BM25Index
+from utils.retrivers.index_versions import new_version_id, publish_version, read_current_version, resolve_index_dir, staging_dir
+from utils.retrivers.numpy_vector_store import NumpyVectorStore, VECTORS_FILE, has_numpy_vector_store
+from utils.retrivers.section_index import SectionIndex
+from utils.retrivers.sqlite_node_store import SqliteNodeStore, has_node_store
 
 # Base directories
-SOURCE_BASE_DIR = '../../data_sources'
-PERSIST_BASE_DIR = '../../databases/llama_index_dbs'
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_BASE_DIR = os.path.abspath(os.path.join(CURRENT_DIR, "../../data_sources"))
+PERSIST_BASE_DIR = os.path.abspath(os.path.join(CURRENT_DIR, "../../databases/llama_index_dbs"))
+
+# Vector store backend: "numpy" (memory-mapped .npy) or "simple" (llama_index JSON)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "numpy")
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
 
-# Embedding model
-embed_model = HuggingFaceEmbedding(model_name="all-MiniLM-L6-v2")
+# Processes used for PDF text extraction and chunking (0 = one per CPU)
+INDEX_PARSE_WORKERS = int(os.getenv("INDEX_PARSE_WORKERS", "0"))
+
+# Chunks per embedding forward pass, and torch intra-op threads for the embedding stage (0 = torch default)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_TORCH_THREADS = int(os.getenv("EMBED_TORCH_THREADS", "0"))
+
+# file name -> content hash and chunk ids of every indexed PDF of a category
+MANIFEST_FILE = "manifest.json"
 
 # Parser that respects page boundaries
 parser = SentenceSplitter(chunk_size=512, chunk_overlap=30)
 
-# Loop through each category
-for category in os.listdir(SOURCE_BASE_DIR):
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(persist_path: str) -> dict:
+    path = os.path.join(persist_path, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"embedding_model": EMBEDDING_MODEL_NAME, "files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict, persist_path: str):
+    with open(os.path.join(persist_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def parse_documents(documents: list) -> list:
+    """
+    Split page documents into chunks carrying `source_file` and `page_number` metadata.
+    """
+    all_nodes = []
+
+    for doc in documents:
+        # Set fallback file name
+        file_name = doc.metadata.get("file_name") or os.path.basename(doc.metadata.get("source_path", "unknown.pdf"))
+        doc.metadata["file_name"] = file_name
+
+        # Get nodes from document
+        doc_nodes = parser.get_nodes_from_documents([doc])
+
+        for node in doc_nodes:
+            # Inject metadata manually
+            node.metadata["source_file"] = file_name
+
+            # Extract page label or page number
+            page = node.metadata.get("page_label") or node.metadata.get("page_number")
+            try:
+                node.metadata["page_number"] = int(page)
+            except:
+                node.metadata["page_number"] = str(page) if page else None
+
+            all_nodes.append(node)
+
+    return all_nodes
+
+
+def parse_pdf(file_path: str) -> tuple:
+    """
+    Load one PDF (one document per page) and split it into chunks.
+    Runs in a worker process of the parse pool.
+
+    Returns: (chunks, page count, seconds spent)
+    """
+    start = time.time()
+    documents: list[Document] = SimpleDirectoryReader(input_files=[file_path]).load_data()
+    return parse_documents(documents), len(documents), time.time() - start
+
+
+def embed_nodes(nodes: list, embed_model):
+    """
+    Embed chunks in batches, using the same text llama_index would embed.
+    """
+    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+    embeddings = embed_model.get_text_embedding_batch(texts)
+    for node, embedding in zip(nodes, embeddings):
+        node.embedding = embedding
+
+
+class IndexingThroughput:
+    """
+    Per-stage counters of one indexing run, used to size build machines.
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.pages = 0
+        self.chunks = 0
+        self.parse_seconds = 0.0
+        self.embed_seconds = 0.0
+        self.start = time.time()
+
+    def report(self, label: str):
+        wall = max(time.time() - self.start, 1e-9)
+        parse = max(self.parse_seconds, 1e-9)
+        embed = max(self.embed_seconds, 1e-9)
+        print(
+            f"📊 {label}: {self.files} files, {self.pages} pages, {self.chunks} chunks in {wall:.1f}s | "
+            f"parse {self.pages / parse:.1f} pages/s, {self.chunks / parse:.1f} chunks/s per worker | "
+            f"embed {self.chunks / embed:.1f} embeddings/s | "
+            f"end to end {self.chunks / wall:.1f} chunks/s"
+        )
+
+
+def parse_and_embed(file_paths: list, embed_model, throughput: IndexingThroughput):
+    """
+    Pipeline: PDFs are parsed and chunked in a process pool while this process embeds
+    the chunks as they arrive. Chunks of consecutive files share forward passes: only
+    whole EMBED_BATCH_SIZE batches are embedded until the last file is parsed, so many
+    small PDFs do not each end in a part-filled batch.
+
+    Yields: (file name, embedded chunks) in completion order, once all its chunks are embedded
+    """
+    if not file_paths:
+        return
+    workers = INDEX_PARSE_WORKERS or os.cpu_count() or 1
+    workers = min(workers, len(file_paths))
+
+    waiting = []  # (file name, chunks, pages) parsed but not fully embedded yet, in arrival order
+    queued = []  # chunks of the waiting files that still need an embedding
+
+    # The embedding model (and torch's thread pool) is already loaded in this process,
+    # so the parse workers are spawned fresh rather than forked from it
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(parse_pdf, path): os.path.basename(path) for path in file_paths}
+        remaining = len(futures)
+        for future in as_completed(futures):
+            file_name = futures[future]
+            nodes, pages, parse_seconds = future.result()
+            remaining -= 1
+            throughput.files += 1
+            throughput.pages += pages
+            throughput.chunks += len(nodes)
+            throughput.parse_seconds += parse_seconds
+            waiting.append((file_name, nodes, pages))
+            queued.extend(nodes)
+
+            batch_size = len(queued) if remaining == 0 else len(queued) // EMBED_BATCH_SIZE * EMBED_BATCH_SIZE
+            if batch_size:
+                start = time.time()
+                embed_nodes(queued[:batch_size], embed_model)
+                del queued[:batch_size]
+                throughput.embed_seconds += time.time() - start
+
+            # Files whose chunks all left the queue are complete
+            while waiting and len(queued) <= sum(len(chunks) for _, chunks, _ in waiting[1:]):
+                done_name, done_nodes, done_pages = waiting.pop(0)
+                print(f"📄 Indexed {done_name}: {done_pages} pages, {len(done_nodes)} chunks")
+                yield done_name, done_nodes
+
+
+def write_derived_indexes(node_store: SqliteNodeStore, persist_path: str):
+    """
+    Rebuild the lexical and section indexes from every node of the category.
+    """
+    nodes = list(node_store.iter_nodes())
+
+    # Lexical index for hybrid (BM25 + vector) retrieval
+    BM25Index.build([node.node_id for node in nodes], [node.get_content() for node in nodes]).persist(persist_path)
+
+    # Act + section -> chunk/page index for direct citation lookups
+    SectionIndex.build(nodes).persist(persist_path)
+
+
+def index_category(category: str, embed_model, full: bool = False):
+    """
+    Index one category with the numpy backend, re-embedding only new or changed PDFs.
+    Args:
+        category: folder name under data_sources
+        embed_model: embedding model used for new chunks
+        full: ignore the existing index and rebuild everything
+    """
     category_path = os.path.join(SOURCE_BASE_DIR, category)
+    category_dir = os.path.join(PERSIST_BASE_DIR, category)
+    persist_path, current_version = resolve_index_dir(category_dir)
 
-    if os.path.isdir(category_path):
-        print(f"\n📄 Indexing category: {category}")
+    manifest = load_manifest(persist_path)
+    previously_indexed = bool(manifest["files"])
+    incremental = (
+        not full
+        and has_numpy_vector_store(persist_path)
+        and has_node_store(persist_path)
+        and manifest.get("embedding_model") == EMBEDDING_MODEL_NAME
+        and manifest["files"]
+    )
+    if not incremental:
+        manifest = {"embedding_model": EMBEDDING_MODEL_NAME, "files": {}}
 
-        try:
-            documents: list[Document] = SimpleDirectoryReader(
-                input_dir=category_path,
-                required_exts=[".pdf"]
-            ).load_data()
-        except ValueError as e:
-            print(f"⚠️  Skipping {category}: {e}")
-            continue
+    current_files = {
+        file_name: file_sha256(os.path.join(category_path, file_name))
+        for file_name in sorted(os.listdir(category_path))
+        if file_name.lower().endswith(".pdf")
+    }
+    if not current_files and not previously_indexed:
+        print(f"⚠️  Skipping {category}: no PDF files found")
+        return
 
-        all_nodes = []
+    removed = [name for name in manifest["files"] if name not in current_files]
+    changed = [name for name, sha in current_files.items() if manifest["files"].get(name, {}).get("sha256") != sha]
+    if not removed and not changed and current_files:
+        print(f"✅ {category} is up to date ({len(current_files)} files)")
+        return
+    if not current_files:
+        # Every PDF was removed: publish an empty snapshot so workers stop serving the old chunks
+        print(f"🗑️  {category}: all PDF files removed, publishing an empty index")
 
-        for doc in documents:
-            # Set fallback file name
-            file_name = doc.metadata.get("file_name") or os.path.basename(doc.metadata.get("source_path", "unknown.pdf"))
-            doc.metadata["file_name"] = file_name
+    if incremental:
+        vector_store = NumpyVectorStore.from_persist_dir(persist_path, writable=True)
+    else:
+        vector_store = NumpyVectorStore(node_store=SqliteNodeStore())
 
-            # Get nodes from document
-            doc_nodes = parser.get_nodes_from_documents([doc])
+    # Drop chunks of removed files and the previous version of changed files
+    stale_node_ids = []
+    for file_name in removed + changed:
+        stale_node_ids.extend(manifest["files"].pop(file_name, {}).get("node_ids", []))
+    if stale_node_ids:
+        vector_store.delete_nodes(stale_node_ids)
 
-            for node in doc_nodes:
-                # Inject metadata manually
-                node.metadata["source_file"] = file_name
+    throughput = IndexingThroughput()
+    file_paths = [os.path.join(category_path, file_name) for file_name in changed]
+    for file_name, nodes in parse_and_embed(file_paths, embed_model, throughput):
+        vector_store.add(nodes)
+        manifest["files"][file_name] = {
+            "sha256": current_files[file_name],
+            "node_ids": [node.node_id for node in nodes],
+        }
 
-                # Extract page label or page number
-                page = node.metadata.get("page_label") or node.metadata.get("page_number")
-                try:
-                    node.metadata["page_number"] = int(page)
-                except:
-                    node.metadata["page_number"] = str(page) if page else None
+    # Write a complete new snapshot, then flip CURRENT; running workers swap it in
+    version = new_version_id()
+    staging_path = staging_dir(category_dir, version)
+    shutil.rmtree(staging_path, ignore_errors=True)
+    os.makedirs(staging_path)
+    vector_store.persist(os.path.join(staging_path, VECTORS_FILE))
+    write_derived_indexes(vector_store.node_store, staging_path)
+    save_manifest(manifest, staging_path)
+    publish_version(category_dir, staging_path, version)
 
-                # Optional: print for debug
-                # print("✅ Node metadata:", node.metadata)
+    print(f"✅ {category}: {len(changed)} files (re)indexed, {len(removed)} removed, "
+          f"{len(stale_node_ids)} stale chunks dropped → version {version} (was {current_version})")
+    throughput.report(category)
 
-                all_nodes.append(node)
 
-        # Persist index
-        persist_path = os.path.join(PERSIST_BASE_DIR, category)
-        os.makedirs(persist_path, exist_ok=True)
+def index_category_simple(category: str, embed_model):
+    """
+    Full rebuild of one category with the llama_index JSON stores.
+    """
+    category_path = os.path.join(SOURCE_BASE_DIR, category)
+    print(f"\n📄 Indexing category: {category}")
+
+    file_paths = [
+        os.path.join(category_path, file_name)
+        for file_name in sorted(os.listdir(category_path))
+        if file_name.lower().endswith(".pdf")
+    ]
+    category_dir = os.path.join(PERSIST_BASE_DIR, category)
+    if not file_paths:
+        if read_current_version(category_dir) is None:
+            print(f"⚠️  Skipping {category}: no PDF files found")
+            return
+        # Every PDF was removed: publish an empty snapshot so workers stop serving the old chunks
+        print(f"🗑️  {category}: all PDF files removed, publishing an empty index")
+
+    throughput = IndexingThroughput()
+    all_nodes = []
+    for _, nodes in parse_and_embed(file_paths, embed_model, throughput):
+        all_nodes.extend(nodes)
+
+    # Persist index as a new snapshot
+    version = new_version_id()
+    persist_path = staging_dir(category_dir, version)
+    shutil.rmtree(persist_path, ignore_errors=True)
+    os.makedirs(persist_path)
+
+    # Chunks already carry their embeddings, so this only builds the stores
+    storage_context = StorageContext.from_defaults()
+    index = VectorStoreIndex(all_nodes, embed_model=embed_model, storage_context=storage_context)
+    index.storage_context.persist(persist_path)
+
+    BM25Index.build([node.node_id for node in all_nodes], [node.get_content() for node in all_nodes]).persist(persist_path)
+    SectionIndex.build(all_nodes).persist(persist_path)
+    publish_version(category_dir, persist_path, version)
+
+    print(f"✅ Finished indexing {len(all_nodes)} chunks → {category_dir} (version {version})")
+    throughput.report(category)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Build the per-category legal indexes")
+    arg_parser.add_argument("--category", help="index only this category")
+    arg_parser.add_argument("--full", action="store_true", help="rebuild from scratch instead of incrementally")
+    args = arg_parser.parse_args()
+
+    if EMBED_TORCH_THREADS:
+        import torch
+        torch.set_num_threads(EMBED_TORCH_THREADS)
+
+    # Embedding model
+    embed_model = HuggingFaceEmbedding(model_name=EMBEDDING_MODEL_NAME, embed_batch_size=EMBED_BATCH_SIZE)
+
+    categories = [args.category] if args.category else sorted(os.listdir(SOURCE_BASE_DIR))
+
+    # Loop through each category
+    for category in categories:
+        if not os.path.isdir(os.path.join(SOURCE_BASE_DIR, category)):
+            continue
+        start = time.time()
+        if VECTOR_STORE_BACKEND == "numpy":
+            index_category(category, embed_model, full=args.full)
+        else:
+            index_category_simple(category, embed_model)
+        print(f"⏱️ {category} took {time.time() - start:.1f}s")
 
-        storage_context = StorageContext.from_defaults()
-        index = VectorStoreIndex(all_nodes, embed_model=embed_model, storage_context=storage_context)
-        index.storage_context.persist(persist_path)
 
-        print(f"✅ Finished indexing {len(all_nodes)} chunks → {persist_path}")
+if __name__ == "__main__":
+    main()
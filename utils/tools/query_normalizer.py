@@ -0,0 +1,21 @@
+import re
+import unicodedata
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+
+def normalize_query(text: str, strip_punctuation: bool = False) -> str:
+    """
+    Normalize a user query for use as a cache key.
+    Args:
+        text: raw user query
+        strip_punctuation: also drop punctuation ("Theft?" == "theft")
+
+    Returns: lower-cased query with unicode, whitespace (and optionally punctuation) normalized
+
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    if strip_punctuation:
+        text = _PUNCTUATION_RE.sub(" ", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()